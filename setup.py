@@ -50,7 +50,7 @@ setup(
     version='0.0.8',
     install_requires=[
         'gym',
-        'ray',
+        'ray>=2.3,<3',
         'pythonflow',
         'numpy',
         'pandas',
@@ -1,7 +1,10 @@
 from .nodes import *
 from .core import KernelDevice
 
-from .kernel.iterator import PandasStateConfig
-from .kernel.manager import MarketOrder
-from .env.gym import Environment
+from .kernel.iterator import PandasStateConfig, state_columns
+from .kernel.frame import ArrayFrame
+from .kernel.catalog import DatasetCatalog
+from .kernel.feature import FeatureConfig, compute_features
+from .kernel.manager import MarketOrder, MarketOrderArray
+from .env.gym import Environment, MultiAgentEnvironment
 
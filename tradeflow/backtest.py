@@ -0,0 +1,354 @@
+import os
+import sys
+import time
+import json
+import argparse
+import importlib
+import multiprocessing
+from multiprocessing.util import Finalize
+
+import numpy as np
+import pandas as pd
+import ray
+
+
+def to_builtin(value):
+    """
+    Converts numpy scalars and arrays (possibly nested in dictionaries and lists) to python builtins,
+    NaN's to None.
+    """
+    if isinstance(value, dict):
+        return {str(key): to_builtin(item) for key, item in value.items()}
+
+    elif isinstance(value, (list, tuple)):
+        return [to_builtin(item) for item in value]
+
+    elif isinstance(value, np.ndarray):
+        return value.tolist()
+
+    elif isinstance(value, np.generic):
+        return to_builtin(value.item())
+
+    elif isinstance(value, float) and np.isnan(value):
+        return None
+
+    else:
+        return value
+
+
+class BacktestWorker(object):
+    """
+    Holds single environment instance and runs policy over dataset episodes.
+    """
+    def __init__(self, env_constructor, env_config, policy=None):
+        """
+
+        Args:
+            env_constructor:    callable returning environment instance given env_config
+            env_config:         env hyperparameters dict, should hold `dataset` DataFrame
+            policy:             callable mapping observation to action; None - random actions
+        """
+        self.env = env_constructor(env_config)
+        # Dataset as prepared by env constructor:
+        self.dataset = self.env.dataset
+        self.policy = policy
+
+    def run(self, episode):
+        """
+        Runs single episode.
+
+        Args:
+            episode:    (episode index, start row, number of rows) tuple
+
+        Returns:
+            dictionary of episode results
+        """
+        index, start, length = episode
+        started = time.time()
+
+        # Feed episode rows as entire dataset, zero duration makes episode iterator take it all:
+        self.env.dataset = self.dataset.iloc[start: start + length].reset_index(drop=True)
+        self.env.episode_duration = 0
+
+        observation = self.env.reset()
+        done = False
+        steps = 0
+        total_reward = 0.0
+        info = {}
+        while not done:
+            if self.policy is None:
+                action = self.env.action_space.sample()
+
+            else:
+                action = self.policy(observation)
+
+            observation, reward, done, info = self.env.step(action)
+            total_reward += reward
+            steps += 1
+
+        result = dict(
+            episode=index,
+            start=start,
+            length=length,
+            steps=steps,
+            total_reward=total_reward,
+            elapsed=time.time() - started,
+        )
+        result.update(info)
+        return to_builtin(result)
+
+    def close(self):
+        """
+        Closes environment, so last episode trade log is saved and remote resources are released.
+        """
+        self.env.close()
+
+
+# Per-process worker for multiprocessing backend:
+_worker = None
+
+
+def _init_process_worker(env_constructor, env_config, policy):
+    global _worker
+    _worker = BacktestWorker(env_constructor, env_config, policy)
+    # Pool has no worker teardown hook; finalizer runs when worker process exits after pool is closed:
+    Finalize(None, _close_process_worker, exitpriority=10)
+
+
+def _close_process_worker():
+    global _worker
+    if _worker is not None:
+        _worker.close()
+        _worker = None
+
+
+def _run_process_worker(episode):
+    return _worker.run(episode)
+
+
+class BacktestRunner(object):
+    """
+    Runs policy over many dataset episodes in parallel, using process pool or Ray actors.
+    Per-episode results are streamed to json-lines file as soon as episodes finish.
+    """
+    modes = ('all', 'random', 'walk_forward')
+    backends = ('process', 'ray')
+
+    def __init__(
+            self,
+            env_constructor,
+            env_config,
+            policy=None,
+            mode='all',
+            episode_duration=None,
+            num_episodes=None,
+            stride=None,
+            num_workers=None,
+            backend='process',
+            output_path=None,
+            seed=None,
+    ):
+        """
+
+        Args:
+            env_constructor:    callable returning environment instance given env_config,
+                                typically instance of EnvironmentConstructor; should be picklable
+            env_config:         env hyperparameters dict, should hold `dataset` DataFrame
+            policy:             picklable callable mapping observation to action; None - random actions
+            mode:               `all` - consecutive non-overlapping episodes covering entire dataset,
+                                `random` - `num_episodes` episodes at random start positions,
+                                `walk_forward` - episodes starting every `stride` rows
+            episode_duration:   episode length in rows, including market state warm-up rows;
+                                defaults to env_config `episode_duration`
+            num_episodes:       number of episodes to run in `random` mode; optional limit in other modes
+            stride:             distance between episode starts in `walk_forward` mode, defaults to episode_duration
+            num_workers:        number of worker processes or actors, defaults to number of CPU's
+            backend:            `process` - local process pool, `ray` - Ray actors
+            output_path:        json-lines file to stream per-episode results to; None - do not save
+            seed:               random seed for `random` mode
+        """
+        try:
+            assert mode in self.modes
+
+        except AssertionError:
+            raise ValueError('Expected `mode` be one of {}, got: {}'.format(self.modes, mode))
+
+        try:
+            assert backend in self.backends
+
+        except AssertionError:
+            raise ValueError('Expected `backend` be one of {}, got: {}'.format(self.backends, backend))
+
+        self.env_constructor = env_constructor
+        self.env_config = env_config
+        self.policy = policy
+        self.mode = mode
+        self.episode_duration = episode_duration or env_config['episode_duration']
+        self.num_episodes = num_episodes
+        self.stride = stride or self.episode_duration
+        self.num_workers = num_workers or os.cpu_count()
+        self.backend = backend
+        self.output_path = output_path
+        self.rng = np.random.RandomState(seed)
+
+    def make_episodes(self):
+        """
+        Splits dataset into episodes.
+
+        Returns:
+            list of (episode index, start row, number of rows) tuples
+        """
+        data_length = self.env_config['dataset'].shape[0]
+        try:
+            assert self.episode_duration <= data_length
+
+        except AssertionError:
+            raise ValueError(
+                'Expected episode be shorter than data length, got: {} and {}'.format(
+                    self.episode_duration, data_length
+                )
+            )
+
+        if self.mode == 'all':
+            starts = np.arange(0, data_length - self.episode_duration + 1, self.episode_duration)
+
+        elif self.mode == 'walk_forward':
+            starts = np.arange(0, data_length - self.episode_duration + 1, self.stride)
+
+        else:
+            try:
+                assert self.num_episodes is not None
+
+            except AssertionError:
+                raise ValueError('Expected `num_episodes` be set in `random` mode')
+
+            starts = self.rng.randint(0, data_length - self.episode_duration + 1, size=self.num_episodes)
+
+        if self.num_episodes is not None:
+            starts = starts[:self.num_episodes]
+
+        return [(i, int(start), self.episode_duration) for i, start in enumerate(starts)]
+
+    def run(self):
+        """
+        Runs all episodes.
+
+        Returns:
+            list of per-episode results dictionaries, in order of completion
+        """
+        episodes = self.make_episodes()
+        results = []
+
+        output = None if self.output_path is None else open(self.output_path, 'a')
+        try:
+            for result in getattr(self, '_run_{}'.format(self.backend))(episodes):
+                results.append(result)
+                if output is not None:
+                    output.write(json.dumps(result) + '\n')
+                    output.flush()
+
+        finally:
+            if output is not None:
+                output.close()
+
+        return results
+
+    def _run_process(self, episodes):
+        pool = multiprocessing.Pool(
+            processes=min(self.num_workers, len(episodes)),
+            initializer=_init_process_worker,
+            initargs=(self.env_constructor, self.env_config, self.policy),
+        )
+        try:
+            for result in pool.imap_unordered(_run_process_worker, episodes):
+                yield result
+
+            # Workers exit normally once pool is closed, closing their environments:
+            pool.close()
+            pool.join()
+
+        finally:
+            pool.terminate()
+
+    def _run_ray(self, episodes):
+        try:
+            assert ray.is_initialized()
+
+        except AssertionError:
+            raise RuntimeError('Ray should be initialized before running backtest with `ray` backend')
+
+        worker_class_ref = ray.remote(BacktestWorker)
+        env_config_id = ray.put(self.env_config)
+        workers = [
+            worker_class_ref.remote(self.env_constructor, env_config_id, self.policy)
+            for _ in range(min(self.num_workers, len(episodes)))
+        ]
+        # Actors execute queued calls in order, so round-robin assignment keeps all of them busy:
+        pending = [workers[i % len(workers)].run.remote(episode) for i, episode in enumerate(episodes)]
+        try:
+            while len(pending) > 0:
+                ready, pending = ray.wait(pending, num_returns=1)
+                yield ray.get(ready[0])
+
+        finally:
+            # On error or early stop, drop queued episodes so workers get to close environments:
+            for object_id in pending:
+                ray.cancel(object_id)
+
+            closing = [worker.close.remote() for worker in workers]
+            ray.wait(closing, num_returns=len(closing))
+            for worker in workers:
+                ray.kill(worker)
+
+
+def load_object(path):
+    """
+    Imports object given as `module.path:attribute`.
+    """
+    module_name, _, attribute = path.partition(':')
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Runs policy over dataset episodes in parallel.')
+    parser.add_argument(
+        '--constructor', default='tradeflow.sample_config:env_constructor',
+        help='environment constructor as `module:attribute`'
+    )
+    parser.add_argument('--dataset', required=True, help='path to csv dataset')
+    parser.add_argument('--policy', default=None, help='policy callable as `module:attribute`; default - random')
+    parser.add_argument('--mode', default='all', choices=BacktestRunner.modes)
+    parser.add_argument('--episode-duration', type=int, required=True)
+    parser.add_argument('--num-episodes', type=int, default=None)
+    parser.add_argument('--stride', type=int, default=None)
+    parser.add_argument('--num-workers', type=int, default=None)
+    parser.add_argument('--backend', default='process', choices=BacktestRunner.backends)
+    parser.add_argument('--output', default='backtest_results.jsonl', help='json-lines results file')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(args)
+
+    if args.backend == 'ray':
+        ray.init()
+
+    runner = BacktestRunner(
+        env_constructor=load_object(args.constructor),
+        env_config=dict(
+            dataset=pd.read_csv(args.dataset, float_precision='high'),
+            episode_duration=args.episode_duration,
+        ),
+        policy=None if args.policy is None else load_object(args.policy),
+        mode=args.mode,
+        episode_duration=args.episode_duration,
+        num_episodes=args.num_episodes,
+        stride=args.stride,
+        num_workers=args.num_workers,
+        backend=args.backend,
+        output_path=args.output,
+        seed=args.seed,
+    )
+    results = runner.run()
+    print('{} episodes done, results saved to: {}'.format(len(results), args.output))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,9 +1,18 @@
 from logbook import Logger, StreamHandler, WARNING, NOTICE, INFO, DEBUG
+import os
 import sys
+import uuid
+import asyncio
+import inspect
+import tracemalloc
 from enum import Enum
 
+import psutil
+
+import numpy as np
 import pythonflow as pf
 import ray
+from ray.util.scheduling_strategies import PlacementGroupSchedulingStrategy
 
 
 class KernelDevice(Enum):
@@ -12,17 +21,78 @@ class KernelDevice(Enum):
     Modes currently supported:
     1 - local in-process execution
     2 - distributed execution as ray.remote task
+    3 - distributed execution by shared ray actor hosting kernels of many nodes (see KernelService)
     """
     # TODO: add kwargs pass-through
     LOCAL = 1
     RAY = 2
+    RAY_SHARED = 3
+
+
+def get_resource_usage(tracemalloc_top=0, filename=None):
+    """
+    Samples resource usage of current process.
+
+    Args:
+        tracemalloc_top:    number of largest allocation sites to report; starts tracemalloc if not tracing yet;
+                            0 - do not trace allocations
+        filename:           report only allocations made by code in that file
+
+    Returns:
+        dictionary of `pid`, `rss`, `vms` (bytes), `cpu_user`, `cpu_system` (seconds), `num_threads`
+        and optionally `allocations`: list of (`file:line`, size in bytes, count) tuples
+    """
+    process = psutil.Process(os.getpid())
+    memory = process.memory_info()
+    cpu = process.cpu_times()
+    usage = dict(
+        pid=process.pid,
+        rss=memory.rss,
+        vms=memory.vms,
+        cpu_user=cpu.user,
+        cpu_system=cpu.system,
+        num_threads=process.num_threads(),
+    )
+    if tracemalloc_top > 0:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+        snapshot = tracemalloc.take_snapshot()
+        if filename is not None:
+            snapshot = snapshot.filter_traces([tracemalloc.Filter(True, filename)])
+
+        usage['allocations'] = [
+            ('{}:{}'.format(stat.traceback[0].filename, stat.traceback[0].lineno), stat.size, stat.count)
+            for stat in snapshot.statistics('lineno')[:tracemalloc_top]
+        ]
+
+    return usage
+
+
+# Process-wide stdout log handler, pushed once rather than per kernel or node instance:
+_stream_handler = None
+
+
+def push_stream_handler():
+    global _stream_handler
+    if _stream_handler is None:
+        _stream_handler = StreamHandler(sys.stdout)
+        _stream_handler.push_application()
+
+    return _stream_handler
 
 
 class Kernel(object):
     """
     Base stateful execution backend class.
     Encapsulates actual computations to get node state.
+
+    Kernels can declare `depends_on`: mapping of evaluation phase ('reset' or 'step') to names of inputs
+    the state depends on in that phase. If change tracking is enabled for the node and none of
+    these inputs changed since last evaluation in the same phase, kernel call is skipped and
+    previous output is reused. Phases not listed are always evaluated.
     """
+    depends_on = None
 
     def __init__(
             self,
@@ -35,7 +105,7 @@ class Kernel(object):
         self.task = task
 
         if log is None:
-            StreamHandler(sys.stdout).push_application()
+            push_stream_handler()
             self.log_level = log_level
             self.log = Logger('{}_{}'.format(self.name, self.task), level=self.log_level)
 
@@ -50,16 +120,215 @@ class Kernel(object):
     def update_state(self, *args, **kwargs):
         return self.state
 
+    def close(self):
+        """
+        Releases kernel resources and flushes any pending output; called when owning node is closed.
+        """
+        pass
+
+    def resource_usage(self, tracemalloc_top=0):
+        """
+        Samples resource usage of process this kernel runs in, see `get_resource_usage`;
+        allocations are reported for kernel class module only.
+        """
+        return get_resource_usage(tracemalloc_top, inspect.getfile(type(self)))
+
+    @classmethod
+    def update_state_batch(cls, kernels, inputs):
+        """
+        Updates states of several kernels of this class at once; used by KernelService.
+        Override with vectorized computation where it pays off.
+
+        Args:
+            kernels:    list of kernel instances
+            inputs:     list of update_state kwargs, one per kernel
+
+        Returns:
+            list of kernels states
+        """
+        return [kernel.update_state(**kernel_inputs) for kernel, kernel_inputs in zip(kernels, inputs)]
+
+
+class KernelService(object):
+    """
+    Hosts many kernels of the same class within single Ray actor, keyed by node id.
+
+    Intended to be run as async Ray actor: concurrent `update_state` calls arriving within `batch_wait`
+    seconds of each other are coalesced and passed to kernel class `update_state_batch` as single batch.
+    Calls of the same kernel are never batched together and are executed in arrival order.
+    """
+    def __init__(self, kernel_class_ref, batch_wait=0.001, max_batch_size=256):
+        """
+
+        Args:
+            kernel_class_ref:   kernel class
+            batch_wait:         seconds to wait for more calls before batch is executed
+            max_batch_size:     batch is executed immediately when that many calls are pending
+        """
+        self.kernel_class_ref = kernel_class_ref
+        self.batch_wait = batch_wait
+        self.max_batch_size = max_batch_size
+        self.kernels = {}
+        self.pending = []
+        self.flush_task = None
+        self.batches = 0
+        self.calls = 0
+
+    def add_kernel(self, key, **kernel_kwargs):
+        self.kernels[key] = self.kernel_class_ref(**kernel_kwargs)
+        return key
+
+    def remove_kernel(self, key):
+        # Calls already submitted for this kernel are executed first:
+        if any(call[0] == key for call in self.pending):
+            self._flush()
+
+        kernel = self.kernels.pop(key, None)
+        if kernel is not None:
+            kernel.close()
+
+    def stats(self):
+        return dict(kernels=len(self.kernels), calls=self.calls, batches=self.batches)
+
+    def resource_usage(self, tracemalloc_top=0):
+        return get_resource_usage(tracemalloc_top, inspect.getfile(self.kernel_class_ref))
+
+    async def update_state(self, key, **inputs):
+        future = asyncio.get_event_loop().create_future()
+        self.pending.append((key, inputs, future))
+
+        if len(self.pending) >= self.max_batch_size:
+            self._flush()
+
+        elif self.flush_task is None:
+            self.flush_task = asyncio.ensure_future(self._delayed_flush())
+
+        return await future
+
+    async def _delayed_flush(self):
+        await asyncio.sleep(self.batch_wait)
+        self.flush_task = None
+        self._flush()
+
+    def _flush(self):
+        pending, self.pending = self.pending, []
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+            self.flush_task = None
+
+        # Split into rounds holding at most one call per kernel, preserving per-kernel order:
+        while len(pending) > 0:
+            batch, deferred, keys = [], [], set()
+            for call in pending:
+                if call[0] in keys:
+                    deferred.append(call)
+
+                else:
+                    keys.add(call[0])
+                    batch.append(call)
+
+            self._execute(batch)
+            pending = deferred
+
+    def _execute(self, batch):
+        self.batches += 1
+        self.calls += len(batch)
+        try:
+            states = self.kernel_class_ref.update_state_batch(
+                [self.kernels[key] for key, _, _ in batch],
+                [inputs for _, inputs, _ in batch],
+            )
+
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+
+            return
+
+        for (_, _, future), state in zip(batch, states):
+            future.set_result(state)
+
+
+class SharedKernelHandle(object):
+    """
+    Exposes single kernel hosted by KernelService actor as if it were ordinary kernel actor handle:
+    `handle.update_state.remote(**inputs)` returns object Id of this kernel state.
+    """
+    def __init__(self, service, key):
+        self.service = service
+        self.key = key
+        self.update_state = self
+
+    def remote(self, **inputs):
+        return self.service.update_state.remote(self.key, **inputs)
+
+    def close(self):
+        """
+        Removes kernel from service.
+        """
+        ray.get(self.service.remove_kernel.remote(self.key))
+
+
+def get_actor_options(ray_options=None, placement_group=None, placement_group_bundle_index=-1):
+    """
+    Makes Ray actor options dictionary.
+
+    Args:
+        ray_options:                    dictionary of Ray actor options (num_cpus, num_gpus, memory, resources, etc.)
+        placement_group:                placement group to schedule actor in, if any
+        placement_group_bundle_index:   placement group bundle index, -1 - any
+
+    Returns:
+        dictionary of kwargs for ray actor class `options` method
+    """
+    options = dict(ray_options or {})
+    if placement_group is not None:
+        options['scheduling_strategy'] = PlacementGroupSchedulingStrategy(
+            placement_group=placement_group,
+            placement_group_bundle_index=placement_group_bundle_index,
+        )
+
+    return options
+
+
+def get_kernel_service(kernel_class_ref, name=None, batch_wait=0.001, max_batch_size=256, actor_options=None):
+    """
+    Returns handle of named KernelService actor for given kernel class, starting one if not running yet.
+
+    Args:
+        kernel_class_ref:   kernel class
+        name:               service actor name, defaults to kernel class name
+        batch_wait:         see KernelService
+        max_batch_size:     see KernelService
+        actor_options:      Ray actor options, only take effect when service actor is started
+
+    Returns:
+        Ray actor handle
+    """
+    if name is None:
+        name = 'KernelService_{}'.format(kernel_class_ref.__name__)
+
+    options = dict(actor_options or {})
+    options.update(name=name, get_if_exists=True)
+
+    return ray.remote(KernelService).options(**options).remote(
+        kernel_class_ref,
+        batch_wait=batch_wait,
+        max_batch_size=max_batch_size,
+    )
+
 
 class GetStateOperation(pf.Operation):
     """
     This class implements node in-graph connectivity  by making an operation which returns actual node state.
+    If `depends_on` mapping is given (see Kernel), skips kernel calls when inputs it depends on are unchanged.
     """
     def __init__(
             self,
             kernel,
             kernel_device,
             name='BaseUpdateOrResetStateOperation',
+            depends_on=None,
             length=None,
             graph=None,
             dependencies=None,
@@ -68,8 +337,29 @@ class GetStateOperation(pf.Operation):
         super().__init__(name=name, length=length, graph=graph, dependencies=dependencies, **inputs)
         self.kernel = kernel
         self.kernel_device = kernel_device
+        self.depends_on = depends_on
+
+        # Last tracked inputs and output, per phase:
+        self.cache = {}
+        self.evaluations = 0
+        self.skipped = 0
 
     def _evaluate(self, **inputs):
+        if self.depends_on is not None:
+            phase, key, hit, output = self._lookup(inputs)
+            if hit:
+                self.skipped += 1
+                return output
+
+        output = self._update_state(**inputs)
+        self.evaluations += 1
+
+        if self.depends_on is not None and key is not None:
+            self.cache[phase] = (key, output)
+
+        return output
+
+    def _update_state(self, **inputs):
         # Inputs can be either python objects or ray object store id's (in case dependent node's kernel were ray tasks)
         # and should be treated accordingly:
         # if current kernel is local one - we should get actual input values via ray.get() methods; pass ray Id's
@@ -83,6 +373,42 @@ class GetStateOperation(pf.Operation):
         else:
             return self.kernel.update_state.remote(**inputs)
 
+    def _lookup(self, inputs):
+        """
+        Checks if inputs current phase depends on are the same as at last evaluation.
+
+        Returns:
+            phase, tracked inputs key (None if phase is not tracked), hit flag, cached output
+        """
+        reset = inputs.get('reset', False)
+        phase = 'reset' if isinstance(reset, (bool, np.bool_)) and reset else 'step'
+
+        if phase == 'reset':
+            # New episode, drop all step outputs:
+            self.cache.pop('step', None)
+
+        names = self.depends_on.get(phase, None)
+        if names is None:
+            return phase, None, False, None
+
+        key = tuple(inputs[name] for name in names)
+        if phase in self.cache:
+            cached_key, output = self.cache[phase]
+            if all(self._unchanged(a, b) for a, b in zip(key, cached_key)):
+                return phase, key, True, output
+
+        return phase, key, False, None
+
+    @staticmethod
+    def _unchanged(value, cached_value):
+        if value is cached_value:
+            return True
+
+        if isinstance(value, (bool, int, float, str, np.generic)) and isinstance(cached_value, type(value)):
+            return value == cached_value
+
+        return False
+
     @staticmethod
     def _get_remote_inputs(**inputs):
         """
@@ -99,6 +425,11 @@ class Node(object):
     """
     Base model building block.
     Encapsulates stateful computation object via kernel and dataflow graph connectivity via StateOperation.
+    With `change_tracking` enabled, kernel calls are skipped when inputs declared by kernel `depends_on` are unchanged.
+    With `KernelDevice.RAY_SHARED` device kernel is hosted by KernelService actor shared by all nodes
+    of the same kernel class and `service_config` (dictionary of `name`, `batch_wait`, `max_batch_size`).
+    Ray actor resources (num_cpus, memory, resources, etc.) are set by `ray_options`,
+    actor placement - by `placement_group` and its bundle index.
     TODO: ? maybe define dedicated State class ~ tf.Tensor-like
     """
     def __init__(
@@ -109,13 +440,21 @@ class Node(object):
             task=0,
             log=None,
             log_level=INFO,
+            change_tracking=False,
+            service_config=None,
+            ray_options=None,
+            placement_group=None,
+            placement_group_bundle_index=-1,
             **kernel_kwargs
     ):
         self.name = name
         self.task = task
+        self.change_tracking = change_tracking
+        self.kernel_depends_on = kernel_class_ref.depends_on
+        self.actor_options = get_actor_options(ray_options, placement_group, placement_group_bundle_index)
 
         if log is None:
-            StreamHandler(sys.stdout).push_application()
+            push_stream_handler()
             self.log_level = log_level
             self.log = Logger('{}_{}'.format(self.name, self.task), level=self.log_level)
 
@@ -149,7 +488,8 @@ class Node(object):
 
             # Make remote ray actor out of kernel klass:
             kernel_actor_class_ref = ray.remote(kernel_class_ref)
-            # TODO: add ray.remote kwargs
+            if len(self.actor_options) > 0:
+                kernel_actor_class_ref = kernel_actor_class_ref.options(**self.actor_options)
 
             self.kernel = kernel_actor_class_ref.remote(
                 log=self.log,
@@ -158,6 +498,28 @@ class Node(object):
                 name=name + '/remote_kernel',
                 **kernel_kwargs
             )
+        elif self.kernel_device == KernelDevice.RAY_SHARED:
+            try:
+                assert ray.is_initialized()
+
+            except AssertionError as e:
+                self.log.error('Ray should be initialized before defining Node Kernel as shared Ray actor')
+                raise Exception(e)
+
+            service = get_kernel_service(kernel_class_ref, actor_options=self.actor_options, **(service_config or {}))
+            key = '{}_{}_{}'.format(name, task, uuid.uuid4().hex)
+            ray.get(
+                service.add_kernel.remote(
+                    key,
+                    log=self.log,
+                    task=task,
+                    log_level=log_level,
+                    name=name + '/shared_kernel',
+                    **kernel_kwargs
+                )
+            )
+            self.kernel = SharedKernelHandle(service, key)
+
         elif self.kernel_device == KernelDevice.LOCAL:
             self.kernel = kernel_class_ref(
                 log=self.log,
@@ -169,6 +531,25 @@ class Node(object):
         else:
             raise ValueError('Unsupported KernelDevice: {}'.format(self.kernel_device))
 
+    @classmethod
+    def required_columns(cls, config):
+        """
+        Returns dataset columns node kernel reads by name, given node configuration dictionary;
+        used for dataset projection. Columns of PandasStateConfig, FeatureConfig and `assets` entries
+        are collected by EnvironmentConstructor regardless, nodes reading other columns should override this.
+        """
+        return []
+
+    def close(self):
+        """
+        Closes kernel; kernel hosted by shared service is closed and removed from service.
+        """
+        if self.kernel_device == KernelDevice.RAY:
+            ray.get(self.kernel.close.remote())
+
+        else:
+            self.kernel.close()
+
     def __call__(self, length=None, graph=None, dependencies=None, **inputs):
         """
         StateOperation constructor. Provides graph connectivity
@@ -185,6 +566,9 @@ class Node(object):
         if self.kernel_device == KernelDevice.RAY:
             name_suffix = '_state_op_remote'
 
+        elif self.kernel_device == KernelDevice.RAY_SHARED:
+            name_suffix = '_state_op_shared'
+
         elif self.kernel_device == KernelDevice.LOCAL:
             name_suffix = '_state_op_local'
 
@@ -195,6 +579,7 @@ class Node(object):
             kernel=self.kernel,
             kernel_device=self.kernel_device,
             name=self.name + name_suffix,
+            depends_on=self.kernel_depends_on if self.change_tracking else None,
             length=length,
             graph=graph,
             dependencies=dependencies,
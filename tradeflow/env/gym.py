@@ -1,10 +1,94 @@
 import gym
 import copy
+import asyncio
+import inspect
+from collections import OrderedDict
+import numpy as np
+import pythonflow as pf
+import ray
+from ray.util.placement_group import placement_group, remove_placement_group
+from pandas import DataFrame
+
+from ..core import KernelDevice, GetStateOperation
+from ..monitor import ResourceMonitor
+
+from ..kernel.iterator import PandasStateConfig
+from ..kernel.feature import FeatureConfig
+from ..kernel.catalog import DatasetCatalog
+
+
+def resolve_remote(values):
+    """
+    Substitutes remote ray.object Id's (if any) in list of values with actual values, fetched in single call.
+    """
+    positions = [i for i, value in enumerate(values) if isinstance(value, ray._raylet.ObjectID)]
+    if len(positions) > 0:
+        for i, value in zip(positions, ray.get([values[i] for i in positions])):
+            values[i] = value
+
+    return values
+
+
+async def resolve_remote_async(values):
+    """
+    Awaits remote ray.object Id's (if any) in list of values and substitutes them with actual values.
+    """
+    positions = [i for i, value in enumerate(values) if isinstance(value, ray._raylet.ObjectID)]
+    if len(positions) > 0:
+        for i, value in zip(positions, await asyncio.gather(*[values[i] for i in positions])):
+            values[i] = value
+
+    return values
+
+
+def collect_operations(value, operations):
+    """
+    Adds all operations given value (operation or nested tuples, lists, dicts of operations) depends on
+    to `operations` set.
+    """
+    if isinstance(value, pf.Operation):
+        if value not in operations:
+            operations.add(value)
+            for item in list(value.args) + list(value.kwargs.values()) + list(value.dependencies):
+                collect_operations(item, operations)
+
+    elif isinstance(value, (tuple, list)):
+        for item in value:
+            collect_operations(item, operations)
+
+    elif isinstance(value, dict):
+        for item in value.values():
+            collect_operations(item, operations)
+
+    return operations
+
+
+def stack_states(states):
+    """
+    Stacks list of (possibly nested dictionaries of) states along new leading axis.
+    """
+    if isinstance(states[0], dict):
+        return {key: stack_states([state[key] for state in states]) for key in states[0].keys()}
+
+    elif isinstance(states[0], tuple):
+        return tuple(stack_states([state[i] for state in states]) for i in range(len(states[0])))
+
+    else:
+        return np.stack([np.asarray(state) for state in states])
 
 
 class Environment(gym.Env):
     """
     Environment is basically a wrapper around pf.Graph with standard API functionality.
+    Graph outputs other than `observation`, `reward` and `done` (e.g. episode metrics)
+    are evaluated as well and returned by `step` as `info` dictionary entries, if not None.
+    With `action_repeat` > 1 every action passed to `step` is repeated that many times
+    (or until episode is done) and rewards are summed.
+    If resource `monitor` is set, it is polled every step.
+
+    `reset_async` and `step_async` coroutines are asyncio counterparts of `reset` and `step`:
+    remote kernels outputs are awaited rather than fetched by blocking ray.get calls,
+    so many environments can be stepped concurrently from single event loop.
     """
     def __init__(
             self,
@@ -15,50 +99,312 @@ class Environment(gym.Env):
             episode_duration,
             action_space,
             observation_space,
+            action_repeat=1,
             name='Environment'
     ):
         # super().__init__()
         self.name = name
         self.action_space = action_space
         self.observation_space = observation_space
+        self.action_repeat = action_repeat
 
         self.graph = graph
 
         # Handles:
         self.input = graph_input
         self.output = graph_output
+        self.info_keys = [key for key in self.output.keys() if key not in ('observation', 'reward', 'done')]
 
         # Parameters:
         self.dataset = dataset
         self.episode_duration = episode_duration
 
+        # Action fed on reset:
+        self.null_action = 0
+
+        # Optional ResourceMonitor instance:
+        self.monitor = None
+
+        # Placement group reserved for remote kernels, if any:
+        self.placement_group = None
+
+        # Dictionary of graph Node instances, set by constructor:
+        self.nodes = None
+
+    def close(self):
+        """
+        Releases resources reserved for environment: shared service kernels and placement group.
+        """
+        if self.nodes is not None:
+            for node in self.nodes.values():
+                node.close()
+
+            self.nodes = None
+
+        if self.placement_group is not None:
+            remove_placement_group(self.placement_group)
+            self.placement_group = None
+
+    def get_fetches(self):
+        """
+        Returns list of graph operations to evaluate every step.
+        """
+        return [self.output['observation'], self.output['reward'], self.output['done']] + \
+            [self.output[key] for key in self.info_keys]
+
+    def split_fetches(self, values):
+        """
+        Maps evaluated fetches to observation, reward, done, info.
+        """
+        observation, reward, done = values[:3]
+        info = {key: value for key, value in zip(self.info_keys, values[3:]) if value is not None}
+        return observation, reward, done, info
+
+    def get_done_positions(self):
+        """
+        Returns indices of `done` operations in fetches list.
+        """
+        done = self.output['done']
+        done = list(done) if isinstance(done, (list, tuple)) else [done]
+        return [i for i, fetch in enumerate(self.get_fetches()) if any(fetch is op for op in done)]
+
     def _evaluate_graph(self, feed_dict):
-        fetches = self.graph(
-            [self.output['observation'], self.output['reward'], self.output['done']], feed_dict
-        )
-        return fetches
+        return self.split_fetches(resolve_remote(list(self.graph(self.get_fetches(), feed_dict))))
+
+    async def _evaluate_graph_async(self, feed_dict):
+        fetches = self.get_fetches()
+
+        context = self.graph.normalize_context(dict(feed_dict))
+        required = collect_operations(fetches, set())
+
+        # Graph operations are stored in order of creation, which is topological one:
+        for operation in self.graph.operations.values():
+            if operation not in required or operation in context:
+                continue
+
+            if isinstance(operation, GetStateOperation) and operation.kernel_device == KernelDevice.LOCAL:
+                # Parents are already evaluated, await their remote outputs before local kernel call:
+                operation.evaluate_dependencies(context)
+                keys = list(operation.kwargs.keys())
+                values = await resolve_remote_async(
+                    [operation.evaluate_operation(operation.kwargs[key], context) for key in keys]
+                )
+                context[operation] = operation._evaluate(**dict(zip(keys, values)))
+
+            else:
+                operation.evaluate(context)
+
+        values = await resolve_remote_async([fetch.evaluate_operation(fetch, context) for fetch in fetches])
+        return self.split_fetches(values)
 
     def reset(self):
         # Redundant: need to run entire graph to properly reset states.
         # todo: maybe implement specific op to reset entire graph state?
         feed_dict = {
                 self.input['reset']: True,
-                self.input['action']: 0,
+                self.input['action']: self.null_action,
                 self.input['dataset']: self.dataset,
                 self.input['episode_duration']: self.episode_duration,
             }
-        observation, reward, done = self._evaluate_graph(feed_dict)
+        observation, reward, done, info = self._evaluate_graph(feed_dict)
         return observation
 
-    def step(self, action):
+    def _step_fetches(self, action):
+        """
+        Makes step and returns evaluated fetches list, remote outputs are not fetched.
+        """
+        feed_dict = {
+                self.input['reset']: False,
+                self.input['action']: action,
+                self.input['dataset']: None,
+                self.input['episode_duration']: None,
+            }
+        if self.monitor is not None:
+            self.monitor.poll()
+
+        return list(self.graph(self.get_fetches(), feed_dict))
+
+    def _step(self, action):
+        return self.split_fetches(resolve_remote(self._step_fetches(action)))
+
+    async def reset_async(self):
+        feed_dict = {
+                self.input['reset']: True,
+                self.input['action']: self.null_action,
+                self.input['dataset']: self.dataset,
+                self.input['episode_duration']: self.episode_duration,
+            }
+        observation, reward, done, info = await self._evaluate_graph_async(feed_dict)
+        return observation
+
+    async def _step_async(self, action):
         feed_dict = {
                 self.input['reset']: False,
                 self.input['action']: action,
                 self.input['dataset']: None,
                 self.input['episode_duration']: None,
             }
-        observation, reward, done = self._evaluate_graph(feed_dict)
-        return observation, reward, done, dict()
+        if self.monitor is not None:
+            self.monitor.poll()
+
+        return await self._evaluate_graph_async(feed_dict)
+
+    async def step_async(self, action):
+        total_reward = 0.0
+        for _ in range(self.action_repeat):
+            observation, reward, done, info = await self._step_async(action)
+            total_reward += reward
+            if done:
+                break
+
+        return observation, total_reward, done, info
+
+    def resource_usage(self):
+        """
+        Samples resource usage of all graph kernels, see ResourceMonitor.
+
+        Returns:
+            usage dictionary or None if monitor is not set
+        """
+        if self.monitor is None:
+            return None
+
+        return self.monitor.sample()
+
+    def step(self, action):
+        total_reward = 0.0
+        for _ in range(self.action_repeat):
+            observation, reward, done, info = self._step(action)
+            total_reward += reward
+            if done:
+                break
+
+        return observation, total_reward, done, info
+
+    def step_many(self, actions):
+        """
+        Makes several environment steps in single call, stops early if episode is done (for all agents).
+        Only `done` flags are fetched every step; other remote outputs are fetched in single call at the end.
+
+        Args:
+            actions:    iterable of actions
+
+        Returns:
+            stacked observations, array of rewards, array of done flags, list of info dictionaries;
+            leading dimension equals number of steps actually made
+        """
+        done_positions = self.get_done_positions()
+        steps = []
+        for action in actions:
+            values = self._step_fetches(action)
+            for i, value in zip(done_positions, resolve_remote([values[i] for i in done_positions])):
+                values[i] = value
+
+            steps.append(values)
+            if np.all(self.split_fetches(values)[2]):
+                break
+
+        try:
+            assert len(steps) > 0
+
+        except AssertionError:
+            raise ValueError('Expected non-empty sequence of actions')
+
+        values = resolve_remote([value for step_values in steps for value in step_values])
+        size = len(steps[0])
+        observations, rewards, dones, infos = zip(
+            *[self.split_fetches(values[i: i + size]) for i in range(0, len(values), size)]
+        )
+        return stack_states(observations), np.asarray(rewards), np.asarray(dones, dtype=bool), list(infos)
+
+
+class MultiAgentEnvironment(Environment):
+    """
+    Environment for several agents trading on the same episode: single episode and market data subgraph
+    feeds per-agent branches (orders, portfolio manager, reward, observation, etc.), see
+    MultiAgentEnvironmentConstructor. Market data is sampled and processed once per step regardless of agents number.
+
+    Action and observation spaces are gym.spaces.Tuple of per-agent spaces. `step` takes sequence of actions,
+    one per agent, and returns tuple of observations, list of rewards, list of done flags and info dictionary
+    with per-agent entries as lists; `step_many` returns tuple of per-agent stacked observations,
+    rewards and done flags arrays of shape [steps, agents] and list of info dictionaries.
+    Graph outputs are either lists of per-agent operations or single operations shared by all agents
+    (e.g. market-driven `done`).
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.num_agents = len(self.action_space.spaces)
+        self.null_action = [0] * self.num_agents
+
+        # Every output maps to fetches number, None for shared single operation:
+        self.layout = OrderedDict()
+        self.fetches = []
+        for key in ['observation', 'reward', 'done'] + self.info_keys:
+            if isinstance(self.output[key], (list, tuple)):
+                try:
+                    assert len(self.output[key]) == self.num_agents
+
+                except AssertionError:
+                    raise ValueError(
+                        'Expected graph output `{}` hold {} agents operations, got: {}'.format(
+                            key, self.num_agents, len(self.output[key])
+                        )
+                    )
+                self.layout[key] = self.num_agents
+                self.fetches += list(self.output[key])
+
+            else:
+                self.layout[key] = None
+                self.fetches.append(self.output[key])
+
+    def get_fetches(self):
+        return self.fetches
+
+    def split_fetches(self, values):
+        outputs = {}
+        pointer = 0
+        for key, size in self.layout.items():
+            if size is None:
+                outputs[key] = values[pointer]
+                pointer += 1
+
+            else:
+                outputs[key] = list(values[pointer: pointer + size])
+                pointer += size
+
+        observation = outputs['observation']
+        observation = tuple(observation) if isinstance(observation, list) else (observation,) * self.num_agents
+        reward, done = [
+            outputs[key] if isinstance(outputs[key], list) else [outputs[key]] * self.num_agents
+            for key in ('reward', 'done')
+        ]
+        info = {
+            key: outputs[key] for key in self.info_keys
+            if outputs[key] is not None
+            and not (isinstance(outputs[key], list) and all(value is None for value in outputs[key]))
+        }
+        return observation, reward, done, info
+
+    def step(self, action):
+        total_reward = np.zeros(self.num_agents)
+        for _ in range(self.action_repeat):
+            observation, reward, done, info = self._step(action)
+            total_reward += np.asarray(reward, dtype=np.float64)
+            if all(done):
+                break
+
+        return observation, list(total_reward), done, info
+
+    async def step_async(self, action):
+        total_reward = np.zeros(self.num_agents)
+        for _ in range(self.action_repeat):
+            observation, reward, done, info = await self._step_async(action)
+            total_reward += np.asarray(await resolve_remote_async(list(reward)), dtype=np.float64)
+            done = await resolve_remote_async(list(done))
+            if all(done):
+                break
+
+        return observation, list(total_reward), done, info
 
 
 class EnvironmentConstructor(object):
@@ -67,7 +413,17 @@ class EnvironmentConstructor(object):
     """
     # TODO: refract: pack all init args to env_config kwarg of __call__ method
 
-    def __init__(self, env_class_ref, nodes_config=None, build_graph_fn=None):
+    def __init__(
+            self,
+            env_class_ref,
+            nodes_config=None,
+            build_graph_fn=None,
+            project_columns=False,
+            float_dtype=None,
+            keep_precision=None,
+            placement_strategy='PACK',
+            monitor_config=None,
+    ):
         """
 
         Args:
@@ -76,9 +432,29 @@ class EnvironmentConstructor(object):
             build_graph_fn:     callable returning pf.Graph instance,
                                 dictionary of graph input handles, dictionary of graph output handles;
                                 if provided, overrides bound method _build_graph
+            project_columns:    if True, keeps only dataset columns nodes actually read,
+                                see `get_required_columns`
+            float_dtype:        if set (e.g. np.float32), floating point dataset columns are cast to this dtype
+            keep_precision:     list of columns not to down-cast; defaults to `assets` columns (prices)
+            placement_strategy: Ray placement group strategy for kernel actors of every environment built,
+                                `PACK` (default) co-locates actors of the graph on single machine when it fits,
+                                `STRICT_PACK` - always; nodes with explicit `placement_group` or scheduling
+                                strategy are not affected; None - leave placement to Ray;
+                                placement group is released by environment `close`
+            monitor_config:     if set, dictionary of ResourceMonitor kwargs (`interval`, `tracemalloc_top`, etc.);
+                                environments built get resource monitor over their nodes
         """
         self.env_class_ref = env_class_ref
         self.nodes_config = nodes_config
+        self.project_columns = project_columns
+        self.float_dtype = float_dtype
+        self.keep_precision = keep_precision
+        self.placement_strategy = placement_strategy
+        self.monitor_config = monitor_config
+
+        # Last source dataset and its prepared version, so all envs built by this constructor share single copy:
+        self._source_dataset = None
+        self._prepared_dataset = None
 
         if build_graph_fn is not None:
             self._build_graph = build_graph_fn
@@ -93,10 +469,15 @@ class EnvironmentConstructor(object):
         Returns:
             instance of env_class_ref
         """
-        nodes = self._build_nodes(self.nodes_config)
-        graph, graph_input, graph_output = self._build_graph(nodes)
-        action_space = nodes['order'].kernel.space
-        observation_space = nodes['observation'].kernel.space
+        if (self.project_columns or self.float_dtype is not None) and 'dataset' in env_config:
+            env_config = dict(env_config)
+            env_config['dataset'] = self._get_dataset(env_config['dataset'])
+
+        pg, placement = self.make_placement(self.nodes_config, self.placement_strategy)
+        nodes = self._build_nodes(self.nodes_config, placement)
+        graph_nodes = self.get_graph_nodes(nodes)
+        graph, graph_input, graph_output = self._build_graph(graph_nodes)
+        action_space, observation_space = self.get_spaces(graph_nodes)
         env = self.env_class_ref(
             graph=graph,
             graph_input=graph_input,
@@ -105,14 +486,182 @@ class EnvironmentConstructor(object):
             observation_space=observation_space,
             **env_config
         )
+        # Placement group and shared kernels are released on environment close:
+        env.placement_group = pg
+        env.nodes = nodes
+
+        if self.monitor_config is not None:
+            env.monitor = ResourceMonitor(nodes, **self.monitor_config)
+
         return env
 
+    def get_graph_nodes(self, nodes):
+        """
+        Returns nodes as passed to graph building function.
+        """
+        return nodes
+
+    @staticmethod
+    def get_spaces(nodes):
+        """
+        Returns environment action and observation spaces.
+        """
+        return nodes['order'].kernel.space, nodes['observation'].kernel.space
+
+    def _get_dataset(self, dataset):
+        if dataset is not self._source_dataset:
+            columns, price_columns = self.get_required_columns(self.nodes_config)
+            self._prepared_dataset = self.prepare_dataset(
+                dataset,
+                columns=columns if self.project_columns else None,
+                float_dtype=self.float_dtype,
+                keep_precision=price_columns if self.keep_precision is None else self.keep_precision,
+            )
+            self._source_dataset = dataset
+
+        return self._prepared_dataset
+
+    @staticmethod
+    def get_required_columns(nodes_config, columns=None, price_columns=None):
+        """
+        Collects dataset columns nodes read: columns of PandasStateConfig and FeatureConfig instances,
+        `assets` and columns declared by node classes `required_columns`.
+
+        Returns:
+            list of all required columns, list of price (`assets`) columns
+        """
+        if columns is None:
+            columns, price_columns = [], []
+
+        if isinstance(nodes_config, PandasStateConfig):
+            columns += [column for column in nodes_config.columns if column not in columns]
+
+        elif isinstance(nodes_config, FeatureConfig):
+            if nodes_config.column not in columns:
+                columns.append(nodes_config.column)
+
+        elif isinstance(nodes_config, dict):
+            # Columns node declares it reads:
+            if hasattr(nodes_config.get('class_ref', None), 'required_columns'):
+                required = nodes_config['class_ref'].required_columns(nodes_config)
+                columns += [column for column in required if column not in columns]
+
+            for key, value in nodes_config.items():
+                if key == 'assets':
+                    price_columns += [column for column in value if column not in price_columns]
+                    columns += [column for column in value if column not in columns]
+
+                else:
+                    EnvironmentConstructor.get_required_columns(value, columns, price_columns)
+
+        return columns, price_columns
+
+    @staticmethod
+    def prepare_dataset(dataset, columns=None, float_dtype=None, keep_precision=()):
+        """
+        Projects dataset to given columns and casts floating point columns to `float_dtype`.
+
+        Args:
+            dataset:            pandas DataFrame, DatasetCatalog or dictionary of as-of merged sources,
+                                which columns are referred as `source/column`; other objects are returned as is
+            columns:            columns to keep, None - keep all
+            float_dtype:        dtype to cast floating point columns to, None - keep dtypes
+            keep_precision:     columns not to down-cast
+
+        Returns:
+            prepared dataset
+        """
+        if isinstance(dataset, DatasetCatalog):
+            return dataset.map(
+                lambda dataframe: EnvironmentConstructor.prepare_dataset(
+                    dataframe, columns, float_dtype, keep_precision
+                )
+            )
+
+        elif isinstance(dataset, dict):
+            prepared = {}
+            for name, source in dataset.items():
+                prefix = '{}/'.format(name)
+                source_columns = [column[len(prefix):] for column in columns or () if column.startswith(prefix)]
+                prepared[name] = EnvironmentConstructor.prepare_dataset(
+                    source,
+                    # Sources no columns are referred of are kept entirely:
+                    source_columns if len(source_columns) > 0 else None,
+                    float_dtype,
+                    [column[len(prefix):] for column in keep_precision if column.startswith(prefix)],
+                )
+
+            return prepared
+
+        elif not isinstance(dataset, DataFrame):
+            return dataset
+
+        if columns is not None:
+            dataset = dataset[[column for column in dataset.columns if column in columns]]
+
+        if float_dtype is not None:
+            dataset = dataset.astype(
+                {
+                    column: float_dtype for column, dtype in dataset.dtypes.items()
+                    if np.issubdtype(dtype, np.floating) and column not in keep_precision
+                }
+            )
+
+        return dataset
+
+    @staticmethod
+    def make_placement(nodes_config, strategy='PACK'):
+        """
+        Reserves placement group with one bundle per Ray actor node, sized by node `ray_options`.
+        Unless `num_cpus` is set explicitly, actors are placed with zero CPUs, as they are by default outside
+        of placement group (Ray default actors CPU requirement applies to scheduling only).
+
+        Args:
+            nodes_config:   nodes configuration dict
+            strategy:       placement group strategy, None - do not make placement group
+
+        Returns:
+            placement group or None, dictionary of extra node kwargs keyed by node name
+        """
+        names = [
+            name for name, config in nodes_config.items()
+            if config.get('device', None) == KernelDevice.RAY and config.get('placement_group', None) is None
+            and 'scheduling_strategy' not in (config.get('ray_options', None) or {})
+        ]
+        if strategy is None or len(names) == 0:
+            return None, {}
+
+        bundles, options = [], {}
+        for name in names:
+            options[name] = dict(nodes_config[name].get('ray_options', None) or {})
+            options[name].setdefault('num_cpus', 0)
+            bundle = dict(options[name].get('resources', None) or {})
+            bundle.update(
+                CPU=options[name]['num_cpus'],
+                GPU=options[name].get('num_gpus', 0),
+                memory=options[name].get('memory', 0),
+            )
+            # Ray rejects bundles of zero resources:
+            bundles.append({key: value for key, value in bundle.items() if value > 0} or {'CPU': 0.001})
+
+        pg = placement_group(bundles, strategy=strategy)
+        ray.get(pg.ready())
+
+        placement = {
+            name: dict(placement_group=pg, placement_group_bundle_index=index, ray_options=options[name])
+            for index, name in enumerate(names)
+        }
+        return pg, placement
+
     @staticmethod
-    def _build_nodes(nodes_config):
+    def _build_nodes(nodes_config, placement=None):
         nodes = {}
         for name, config in nodes_config.items():
             node_config = copy.deepcopy(config)
             node_class = node_config.pop('class_ref')
+            if placement is not None and name in placement:
+                node_config.update(placement[name])
+
             nodes[name] = node_class(**node_config)
 
         return nodes
@@ -127,3 +676,87 @@ class EnvironmentConstructor(object):
             pf.Graph instance, dictionary of graph input handles, dictionary of graph output handles
         """
         return None, None, None
+
+
+class MultiAgentEnvironmentConstructor(EnvironmentConstructor):
+    """
+    Builds environment for several agents sharing single episode and market data subgraph,
+    see MultiAgentEnvironment.
+
+    Nodes listed in `agent_nodes` are instantiated `num_agents` times, named with `_<agent index>` suffix;
+    all other nodes are instantiated once. Graph building function gets nodes dictionary
+    where agent nodes entries are lists of per-agent nodes; it should feed i-th agent order node with
+    i-th entry of `action` input and return per-agent outputs as lists of operations.
+    """
+    def __init__(
+            self,
+            env_class_ref,
+            nodes_config=None,
+            num_agents=2,
+            agent_nodes=('order', 'manager', 'reward', 'metrics', 'observation'),
+            **kwargs
+    ):
+        """
+
+        Args:
+            env_class_ref:      environment wrapper class, MultiAgentEnvironment or its subclass
+            nodes_config:       nodes configuration dict, agent nodes configured once for all agents
+            num_agents:         number of agents
+            agent_nodes:        names of nodes replicated per agent
+            **kwargs:           see EnvironmentConstructor
+        """
+        try:
+            assert num_agents >= 1
+            assert all(name in nodes_config for name in agent_nodes)
+
+        except AssertionError:
+            raise ValueError(
+                'Expected positive `num_agents` and `agent_nodes` from {}, got: {} and {}'.format(
+                    list(nodes_config.keys()), num_agents, agent_nodes
+                )
+            )
+
+        self.num_agents = num_agents
+        self.agent_nodes = tuple(agent_nodes)
+        self.agent_nodes_config = nodes_config
+        super().__init__(
+            env_class_ref,
+            nodes_config=self.expand_nodes_config(nodes_config, self.agent_nodes, num_agents),
+            **kwargs
+        )
+
+    @staticmethod
+    def expand_nodes_config(nodes_config, agent_nodes, num_agents):
+        """
+        Returns flat nodes configuration with every agent node config copied per agent under `<name>_<index>` key.
+        """
+        expanded = OrderedDict()
+        for key, config in nodes_config.items():
+            if key not in agent_nodes:
+                expanded[key] = config
+                continue
+
+            # Graph operation names should be unique:
+            name = config.get('name', inspect.signature(config['class_ref']).parameters['name'].default)
+            for i in range(num_agents):
+                expanded['{}_{}'.format(key, i)] = dict(config, name='{}_{}'.format(name, i))
+
+        return expanded
+
+    def get_graph_nodes(self, nodes):
+        graph_nodes = {}
+        for key in self.agent_nodes_config.keys():
+            if key in self.agent_nodes:
+                graph_nodes[key] = [nodes['{}_{}'.format(key, i)] for i in range(self.num_agents)]
+
+            else:
+                graph_nodes[key] = nodes[key]
+
+        return graph_nodes
+
+    @staticmethod
+    def get_spaces(nodes):
+        return (
+            gym.spaces.Tuple([node.kernel.space for node in nodes['order']]),
+            gym.spaces.Tuple([node.kernel.space for node in nodes['observation']]),
+        )
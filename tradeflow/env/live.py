@@ -0,0 +1,366 @@
+from logbook import Logger, INFO
+import time
+import json
+import queue
+import socket
+import threading
+from collections import deque, OrderedDict
+
+import numpy as np
+
+from .gym import resolve_remote
+
+
+class LatencyHistogram(object):
+    """
+    Fixed memory latency histogram with logarithmically spaced bins.
+    """
+    def __init__(self, min_value=1e-6, max_value=10.0, bins_per_decade=20):
+        """
+
+        Args:
+            min_value:          lowest bin edge, seconds; smaller values fall into first bin
+            max_value:          highest bin edge, seconds; larger values fall into last bin
+            bins_per_decade:    resolution
+        """
+        self.edges = np.logspace(
+            np.log10(min_value),
+            np.log10(max_value),
+            int(round(np.log10(max_value / min_value) * bins_per_decade)) + 1
+        )
+        self.counts = np.zeros(self.edges.shape[0] + 1, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value):
+        self.counts[np.searchsorted(self.edges, value, side='right')] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, q):
+        """
+        Returns upper edge of the bin holding q-th percentile, q in [0, 100].
+        """
+        if self.count == 0:
+            return np.nan
+
+        index = int(np.searchsorted(np.cumsum(self.counts), q / 100 * self.count, side='left'))
+        return float(self.edges[min(index, self.edges.shape[0] - 1)])
+
+    def summary(self):
+        return OrderedDict(
+            count=self.count,
+            mean=self.total / self.count if self.count > 0 else np.nan,
+            p50=self.percentile(50),
+            p90=self.percentile(90),
+            p99=self.percentile(99),
+            max=self.max,
+        )
+
+
+class EventBuffer(object):
+    """
+    Bounded thread-safe events buffer with overflow policy:
+    `block` - producer waits for free space (backpressure),
+    `drop_oldest` - oldest buffered event is discarded to make room,
+    `drop_newest` - incoming event is discarded.
+    """
+    policies = ('block', 'drop_oldest', 'drop_newest')
+
+    def __init__(self, capacity=1024, policy='block'):
+        try:
+            assert policy in self.policies
+
+        except AssertionError:
+            raise ValueError('Expected overflow `policy` be one of {}, got: {}'.format(self.policies, policy))
+
+        self.capacity = capacity
+        self.policy = policy
+        self.items = deque()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def put(self, item, timeout=None):
+        """
+        Adds item to buffer.
+
+        Returns:
+            True if item is buffered, False if it is dropped
+        """
+        with self.condition:
+            if self.closed:
+                return False
+
+            if len(self.items) >= self.capacity:
+                if self.policy == 'drop_newest':
+                    self.dropped += 1
+                    return False
+
+                elif self.policy == 'drop_oldest':
+                    self.items.popleft()
+                    self.dropped += 1
+
+                elif not self.condition.wait_for(
+                        lambda: len(self.items) < self.capacity or self.closed, timeout=timeout
+                ) or self.closed:
+                    self.dropped += 1
+                    return False
+
+            self.items.append(item)
+            self.condition.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """
+        Removes and returns oldest item; raises queue.Empty if buffer is closed and empty or timeout expires.
+        """
+        with self.condition:
+            if not self.condition.wait_for(lambda: len(self.items) > 0 or self.closed, timeout=timeout):
+                raise queue.Empty
+
+            if len(self.items) == 0:
+                raise queue.Empty
+
+            item = self.items.popleft()
+            self.condition.notify_all()
+            return item
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+class LiveRunner(object):
+    """
+    Event-driven environment runner: every incoming market event is processed end-to-end,
+    from graph evaluation to policy action sent to sink.
+
+    Expects environment whose market data node is StreamingMarketStep (preferably with `lookahead=False`)
+    fed directly by `dataset` graph input: runner substitutes environment dataset with generator
+    of buffered events, so each `step` consumes exactly one event. First events fill state window on reset.
+    Action decided upon an event is applied on the next one.
+
+    Per stage latencies are recorded: `queue` (event arrival to dequeue), `graph` (env step),
+    `policy`, `sink` and `total` (event arrival to action sent).
+    """
+    stages = ('queue', 'graph', 'policy', 'sink', 'total')
+
+    def __init__(
+            self,
+            env,
+            policy,
+            sink=None,
+            capacity=1024,
+            overflow_policy='block',
+            histogram_config=None,
+            log_interval=None,
+            log_level=INFO,
+            name='LiveRunner',
+    ):
+        """
+
+        Args:
+            env:                environment instance
+            policy:             callable mapping observation to action
+            sink:               callable receiving (action, event) or queue.Queue to put such tuples to;
+                                None - actions are discarded
+            capacity:           events buffer size
+            overflow_policy:    `block`, `drop_oldest` or `drop_newest`, see EventBuffer
+            histogram_config:   dictionary of LatencyHistogram kwargs
+            log_interval:       seconds between latency summaries logging, None - do not log
+        """
+        self.env = env
+        self.policy = policy
+        self.sink = sink
+        self.buffer = EventBuffer(capacity, overflow_policy)
+        self.histograms = OrderedDict(
+            [(stage, LatencyHistogram(**(histogram_config or {}))) for stage in self.stages]
+        )
+        self.log_interval = log_interval
+        self.log = Logger(name, level=log_level)
+
+        self.events = 0
+        self.arrival_time = None
+        self.dequeue_time = None
+        self.event = None
+        self.running = False
+
+    def submit(self, event, timeout=None):
+        """
+        Passes incoming market event (row mapping or values sequence) to runner; thread-safe.
+
+        Returns:
+            True if event is accepted, False if it is dropped
+        """
+        return self.buffer.put((time.perf_counter(), event), timeout=timeout)
+
+    def close(self):
+        """
+        Signals end of events stream; runner finishes after processing buffered events.
+        """
+        self.buffer.close()
+
+    def rows(self):
+        """
+        Yields buffered events, stamping their arrival and dequeue times.
+        """
+        while True:
+            try:
+                self.arrival_time, self.event = self.buffer.get()
+
+            except queue.Empty:
+                return
+
+            self.dequeue_time = time.perf_counter()
+            yield self.event
+
+    def send(self, action):
+        if self.sink is None:
+            return
+
+        elif isinstance(self.sink, queue.Queue):
+            self.sink.put((action, self.event))
+
+        else:
+            self.sink(action, self.event)
+
+    def run(self):
+        """
+        Processes events until stream is closed and drained.
+
+        Returns:
+            stats dictionary, see `stats`
+        """
+        self.running = True
+        last_log_time = time.perf_counter()
+        self.env.dataset = self.rows()
+        observation = self.env.reset()
+        action = self.policy(observation)
+
+        while self.running:
+            started = time.perf_counter()
+            last_dequeue_time = self.dequeue_time
+            observation, reward, done, info = resolve_remote(list(self.env.step(action)))
+
+            if self.dequeue_time != last_dequeue_time:
+                graph_done = time.perf_counter()
+                action = self.policy(observation)
+                policy_done = time.perf_counter()
+                self.send(action)
+                sink_done = time.perf_counter()
+
+                self.events += 1
+                self.histograms['queue'].record(self.dequeue_time - self.arrival_time)
+                # Step blocks waiting for event, graph work starts when it is dequeued:
+                self.histograms['graph'].record(graph_done - max(started, self.dequeue_time))
+                self.histograms['policy'].record(policy_done - graph_done)
+                self.histograms['sink'].record(sink_done - policy_done)
+                self.histograms['total'].record(sink_done - self.arrival_time)
+
+                if self.log_interval is not None and sink_done - last_log_time >= self.log_interval:
+                    self.log.info(self.format(self.stats()))
+                    last_log_time = sink_done
+
+            if done:
+                # Stream exhausted or episode is over by other graph logic:
+                break
+
+        self.running = False
+        return self.stats()
+
+    def stop(self):
+        self.running = False
+        self.buffer.close()
+
+    def stats(self):
+        return OrderedDict(
+            events=self.events,
+            dropped=self.buffer.dropped,
+            buffered=len(self.buffer),
+            latency=OrderedDict([(stage, histogram.summary()) for stage, histogram in self.histograms.items()]),
+        )
+
+    @staticmethod
+    def format(stats):
+        lines = ['events: {}, dropped: {}, buffered: {}'.format(stats['events'], stats['dropped'], stats['buffered'])]
+        for stage, summary in stats['latency'].items():
+            lines.append(
+                '{}: mean {:.1f} us, p50 {:.1f} us, p99 {:.1f} us, max {:.1f} us'.format(
+                    stage, summary['mean'] * 1e6, summary['p50'] * 1e6, summary['p99'] * 1e6, summary['max'] * 1e6
+                )
+            )
+        return '\n'.join(lines)
+
+
+class ReplayFeeder(threading.Thread):
+    """
+    Replays recorded market data to LiveRunner from background thread, for testing live mode offline.
+    """
+    def __init__(self, runner, source, rate=None, close=True):
+        """
+
+        Args:
+            runner:     LiveRunner instance
+            source:     pandas DataFrame (rows are submitted as dictionaries) or iterable of events
+            rate:       events per second, None - as fast as possible
+            close:      if True, closes runner stream when source is exhausted
+        """
+        super().__init__(daemon=True)
+        self.runner = runner
+        self.source = source
+        self.rate = rate
+        self.close_stream = close
+        self.submitted = 0
+
+    def run(self):
+        if hasattr(self.source, 'to_dict'):
+            events = self.source.to_dict('records')
+
+        else:
+            events = self.source
+
+        started = time.perf_counter()
+        for i, event in enumerate(events):
+            if self.rate is not None:
+                delay = started + i / self.rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+            self.runner.submit(event)
+            self.submitted += 1
+
+        if self.close_stream:
+            self.runner.close()
+
+
+class SocketFeeder(threading.Thread):
+    """
+    Accepts single local TCP connection and submits every received newline-delimited json event to LiveRunner.
+    Closes runner stream when connection is closed.
+    """
+    def __init__(self, runner, host='127.0.0.1', port=0):
+        super().__init__(daemon=True)
+        self.runner = runner
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((host, port))
+        self.server.listen(1)
+        # Actual address, if port is chosen by OS:
+        self.address = self.server.getsockname()
+
+    def run(self):
+        connection, _ = self.server.accept()
+        with connection, connection.makefile('r') as stream:
+            for line in stream:
+                if line.strip():
+                    self.runner.submit(json.loads(line))
+
+        self.server.close()
+        self.runner.close()
@@ -0,0 +1,205 @@
+import ray
+from ray.rllib.env.base_env import BaseEnv, ASYNC_RESET_RETURN, _DUMMY_AGENT_ID
+
+
+class EnvironmentShard(object):
+    """
+    Hosts several environments within single process and steps them together per call.
+    Intended to be run as Ray actor, see ShardedVectorEnv.
+    """
+    def __init__(self, env_constructor, env_config, num_envs):
+        """
+
+        Args:
+            env_constructor:    callable returning environment instance given env_config,
+                                typically instance of EnvironmentConstructor
+            env_config:         env hyperparameters dict
+            num_envs:           number of environments to host
+        """
+        self.envs = [env_constructor(env_config) for _ in range(num_envs)]
+
+    def spaces(self):
+        return self.envs[0].observation_space, self.envs[0].action_space
+
+    def reset(self, indices):
+        """
+        Resets environments specified by local indices.
+
+        Returns:
+            dictionary of (observation, reward, done, info) tuples keyed by local environment index;
+            reward is None for episode first observation
+        """
+        return {index: (self.envs[index].reset(), None, False, {}) for index in indices}
+
+    def step(self, actions):
+        """
+        Steps environments with actions keyed by local environment index.
+
+        Returns:
+            dictionary of (observation, reward, done, info) tuples keyed by local environment index
+        """
+        return {index: self.envs[index].step(action) for index, action in actions.items()}
+
+
+class ShardedVectorEnv(BaseEnv):
+    """
+    Exposes many tradeflow environments as single RLlib BaseEnv.
+
+    Environments are sharded across `num_shards` Ray actors, `envs_per_shard` environments each,
+    so every actor call steps entire batch of environments it hosts.
+    Polling is asynchronous: `poll` returns results of all shards ready by the time
+    first one is, slow shards do not stall the batch.
+
+    Implements BaseEnv contract of RLlib shipped with Ray 2.x: tradeflow `done` flag is reported
+    as episode termination, episodes are never truncated.
+    """
+    def __init__(
+            self,
+            env_constructor,
+            env_config,
+            num_shards=1,
+            envs_per_shard=1,
+            poll_timeout=None,
+            actor_options=None,
+    ):
+        """
+
+        Args:
+            env_constructor:    callable returning environment instance given env_config,
+                                typically instance of EnvironmentConstructor
+            env_config:         env hyperparameters dict; put to object store once and shared by all shards
+            num_shards:         number of Ray actors to run
+            envs_per_shard:     number of environments hosted by every actor
+            poll_timeout:       seconds `poll` waits for any shard results, None - wait forever;
+                                if no shard is ready by then, `poll` returns empty dictionaries
+            actor_options:      dictionary of Ray actor options (num_cpus, memory, resources, etc.)
+        """
+        try:
+            assert ray.is_initialized()
+
+        except AssertionError:
+            raise RuntimeError('Ray should be initialized before instantiating {}'.format(self.__class__.__name__))
+
+        self.num_shards = num_shards
+        self.envs_per_shard = envs_per_shard
+        self.num_envs = num_shards * envs_per_shard
+        self.poll_timeout = poll_timeout
+
+        shard_class_ref = ray.remote(EnvironmentShard)
+        if actor_options is not None:
+            shard_class_ref = shard_class_ref.options(**actor_options)
+
+        env_config_id = ray.put(env_config)
+        self.shards = [
+            shard_class_ref.remote(env_constructor, env_config_id, envs_per_shard) for _ in range(num_shards)
+        ]
+        self._observation_space, self._action_space = ray.get(self.shards[0].spaces.remote())
+
+        # Maps pending result Id's to shard index:
+        self.pending = {}
+
+        # Local env. indices waiting to be reset, per shard:
+        self.pending_resets = {shard_index: list(range(envs_per_shard)) for shard_index in range(num_shards)}
+
+    @property
+    def observation_space(self):
+        return self._observation_space
+
+    @property
+    def action_space(self):
+        return self._action_space
+
+    def _env_id(self, shard_index, local_index):
+        return shard_index * self.envs_per_shard + local_index
+
+    def _local_index(self, env_id):
+        return divmod(env_id, self.envs_per_shard)
+
+    def _submit_resets(self):
+        for shard_index, indices in self.pending_resets.items():
+            if len(indices) > 0:
+                self.pending[self.shards[shard_index].reset.remote(indices)] = shard_index
+
+        self.pending_resets = {shard_index: [] for shard_index in range(self.num_shards)}
+
+    def poll(self):
+        self._submit_resets()
+
+        obs, rewards, terminateds, truncateds, infos = {}, {}, {}, {}, {}
+        if len(self.pending) == 0:
+            return obs, rewards, terminateds, truncateds, infos, {}
+
+        # Wait for at least one shard, then collect all others already done:
+        ready, _ = ray.wait(list(self.pending), num_returns=1, timeout=self.poll_timeout)
+        if len(ready) == 0:
+            return obs, rewards, terminateds, truncateds, infos, {}
+
+        not_ready = [object_id for object_id in self.pending if object_id not in ready]
+        if len(not_ready) > 0:
+            ready += ray.wait(not_ready, num_returns=len(not_ready), timeout=0)[0]
+
+        for object_id, results in zip(ready, ray.get(ready)):
+            shard_index = self.pending.pop(object_id)
+            for local_index, (observation, reward, done, info) in results.items():
+                env_id = self._env_id(shard_index, local_index)
+                obs[env_id] = {_DUMMY_AGENT_ID: observation}
+                rewards[env_id] = {_DUMMY_AGENT_ID: reward}
+                terminateds[env_id] = {_DUMMY_AGENT_ID: done, '__all__': done}
+                truncateds[env_id] = {_DUMMY_AGENT_ID: False, '__all__': False}
+                infos[env_id] = {_DUMMY_AGENT_ID: info}
+
+        return obs, rewards, terminateds, truncateds, infos, {}
+
+    def send_actions(self, action_dict):
+        actions = {}
+        for env_id, agent_actions in action_dict.items():
+            shard_index, local_index = self._local_index(env_id)
+            actions.setdefault(shard_index, {})[local_index] = agent_actions[_DUMMY_AGENT_ID]
+
+        for shard_index, shard_actions in actions.items():
+            self.pending[self.shards[shard_index].step.remote(shard_actions)] = shard_index
+
+    def try_reset(self, env_id=None, *, seed=None, options=None):
+        # Resets are batched per shard and submitted on next poll;
+        # `seed` and `options` are ignored: episodes are sampled by environments own iterators.
+        if env_id is None:
+            for shard_index in range(self.num_shards):
+                self.pending_resets[shard_index] = list(range(self.envs_per_shard))
+
+        else:
+            shard_index, local_index = self._local_index(env_id)
+            self.pending_resets[shard_index].append(local_index)
+
+        return ASYNC_RESET_RETURN, ASYNC_RESET_RETURN
+
+    def stop(self):
+        for shard in self.shards:
+            ray.kill(shard)
+
+        self.shards = []
+        self.pending = {}
+
+
+def make_sharded_env_creator(env_constructor, num_shards=1, envs_per_shard=1, **kwargs):
+    """
+    Returns RLlib environment creator function, suitable for ray.tune.register_env.
+
+    Args:
+        env_constructor:    callable returning environment instance given env_config
+        num_shards:         number of Ray actors per rollout worker
+        envs_per_shard:     number of environments hosted by every actor
+        **kwargs:           other ShardedVectorEnv kwargs
+
+    Returns:
+        callable mapping env_config to ShardedVectorEnv instance
+    """
+    def env_creator(env_config):
+        return ShardedVectorEnv(
+            env_constructor,
+            dict(env_config),
+            num_shards=num_shards,
+            envs_per_shard=envs_per_shard,
+            **kwargs
+        )
+
+    return env_creator
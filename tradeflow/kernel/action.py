@@ -1,13 +1,19 @@
 from logbook import INFO
+import numpy as np
 from collections import namedtuple
 
 from btgym.spaces import ActionDictSpace
-from gym.spaces import Discrete
+from gym.spaces import Discrete, MultiDiscrete
 
 from ..core import Kernel
 
 MarketOrder = namedtuple('MarketOrder', ['asset', 'type'])
 
+# Batch of orders as arrays: asset indices (into portfolio manager assets) and type indices into ORDER_TYPES:
+MarketOrderArray = namedtuple('MarketOrderArray', ['asset', 'type'])
+
+ORDER_TYPES = ('buy', 'sell', 'close')
+
 
 class DiscreteActionToMarketOrder(Kernel):
     """
@@ -107,4 +113,50 @@ class AssetActionToMarketOrder(Kernel):
             self.log.error(e)
             raise TypeError(e)
 
-        self.state = [MarketOrder(asset, self.action_map[value]) for asset, value in action.items() if value != 0]
\ No newline at end of file
+        self.state = [MarketOrder(asset, self.action_map[value]) for asset, value in action.items() if value != 0]
+
+
+class ArrayActionToMarketOrder(Kernel):
+    """
+    Maps gym.spaces.MultiDiscrete actions, i.e. integer arrays indexed by asset
+    (0 - hold, 1 - buy, 2 - sell, 3 - close), to MarketOrderArray of non-hold entries.
+    Validation and decoding are vectorized, no per-asset python objects are made;
+    `assets` should be ordered as portfolio manager ones.
+    """
+    def __init__(
+            self,
+            assets,
+            name='ArrayActionMap',
+            task=0,
+            log=None,
+            log_level=INFO,
+    ):
+        super().__init__(name=name, task=task, log=log, log_level=log_level)
+        self.assets = list(assets)
+        self.num_actions = len(ORDER_TYPES) + 1
+        self.space = MultiDiscrete([self.num_actions] * len(self.assets))
+        self.no_orders = MarketOrderArray(np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int8))
+
+    def update_state(self, input_state, reset):
+        if reset:
+            self.state = self.no_orders
+
+        else:
+            self._update_state(input_state)
+
+        return self.state
+
+    def _update_state(self, action):
+        action = np.asarray(action)
+        try:
+            assert action.shape == (len(self.assets),)
+            assert np.issubdtype(action.dtype, np.integer)
+            assert action.min() >= 0 and action.max() < self.num_actions
+
+        except (AssertionError, TypeError):
+            e = 'Provided action `{}` is not a valid member of defined action space `{}`'.format(action, self.space)
+            self.log.error(e)
+            raise TypeError(e)
+
+        assets = np.flatnonzero(action)
+        self.state = MarketOrderArray(assets.astype(np.int32), (action[assets] - 1).astype(np.int8))
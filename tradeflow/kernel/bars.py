@@ -0,0 +1,324 @@
+from logbook import INFO
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from ..core import Kernel
+from .stream import iterate_timestamped, to_timestamps
+
+
+BAR_COLUMNS = ['open', 'high', 'low', 'close', 'volume', 'vwap', 'count']
+
+
+class BarAggregator(object):
+    """
+    Aggregates ticks to OHLC bars with volume, volume weighted average price and ticks count.
+
+    Every tick is assigned bar id, bar is closed as soon as tick of the next id arrives:
+    `time` bars - id is tick timestamp divided by bar duration (empty periods make no bars),
+    `tick` bars - id is number of preceding ticks divided by `size`,
+    `volume` bars - id is volume traded before the tick divided by `size`,
+    so bar closes at the tick its volume reaches `size`.
+    Incremental updates are O(1) per tick, `bulk` aggregates entire arrays with same result.
+    Bars are stamped with their last tick timestamp.
+    """
+    kinds = ('time', 'tick', 'volume')
+
+    def __init__(self, kind='time', size=60):
+        """
+
+        Args:
+            kind:   bar type: `time`, `tick` or `volume`
+            size:   bar duration (anything convertible to pandas.Timedelta; numbers are seconds)
+                    for time bars, number of ticks or traded volume per bar otherwise
+        """
+        try:
+            assert kind in self.kinds
+
+        except AssertionError:
+            raise ValueError('Expected bar `kind` be one of {}, got: {}'.format(self.kinds, kind))
+
+        self.kind = kind
+        if kind == 'time':
+            if isinstance(size, (int, float)):
+                size = pd.Timedelta(seconds=size)
+
+            self.size = pd.Timedelta(size).value
+
+        else:
+            self.size = size
+
+        self.reset()
+
+    def reset(self):
+        self.bar_id = None
+        self.ticks = 0
+        self.cum_volume = 0.0
+        self.timestamp = None
+        self.open = self.high = self.low = self.close = np.nan
+        self.volume = 0.0
+        self.price_volume = 0.0
+        self.count = 0
+
+    def get_id(self, timestamp):
+        if self.kind == 'time':
+            return timestamp // self.size
+
+        elif self.kind == 'tick':
+            return self.ticks // self.size
+
+        else:
+            return int(self.cum_volume // self.size)
+
+    def get_bar(self):
+        vwap = self.price_volume / self.volume if self.volume > 0 else self.close
+        return self.timestamp, np.asarray(
+            [self.open, self.high, self.low, self.close, self.volume, vwap, self.count],
+            dtype=np.float64
+        )
+
+    def update(self, timestamp, price, volume=0.0):
+        """
+        Adds tick.
+
+        Returns:
+            (timestamp, values ordered as BAR_COLUMNS) of bar closed by this tick or None
+        """
+        bar_id = self.get_id(timestamp)
+        closed = None
+        if bar_id != self.bar_id:
+            if self.count > 0:
+                closed = self.get_bar()
+
+            self.bar_id = bar_id
+            self.open = self.high = self.low = price
+            self.volume = 0.0
+            self.price_volume = 0.0
+            self.count = 0
+
+        self.high = max(self.high, price)
+        self.low = min(self.low, price)
+        self.close = price
+        self.volume += volume
+        self.price_volume += price * volume
+        self.count += 1
+        self.timestamp = timestamp
+        self.ticks += 1
+        self.cum_volume += volume
+
+        return closed
+
+    def flush(self):
+        """
+        Returns current (not closed yet) bar or None if it is empty.
+        """
+        if self.count > 0:
+            return self.get_bar()
+
+        return None
+
+    def get_ids(self, timestamps, volumes):
+        if self.kind == 'time':
+            return timestamps // self.size
+
+        elif self.kind == 'tick':
+            return np.arange(timestamps.shape[0]) // self.size
+
+        else:
+            # Volume traded before every tick:
+            return (np.concatenate([[0.0], np.cumsum(volumes)[:-1]]) // self.size).astype(np.int64)
+
+    def bulk(self, timestamps, prices, volumes=None, include_last=True):
+        """
+        Aggregates entire time-sorted ticks arrays at once; does not touch incremental state.
+
+        Args:
+            timestamps:     ticks timestamps, int64 nanoseconds or datetime-like
+            prices:         ticks prices
+            volumes:        ticks volumes, None - zeros
+            include_last:   if False, drops last bar, as it could be not closed yet
+
+        Returns:
+            bars timestamps array, 2d array of bars values ordered as BAR_COLUMNS
+        """
+        timestamps = to_timestamps(timestamps)
+        prices = np.asarray(prices, dtype=np.float64)
+        volumes = np.zeros_like(prices) if volumes is None else np.asarray(volumes, dtype=np.float64)
+
+        if prices.shape[0] == 0:
+            return timestamps[:0], np.zeros((0, len(BAR_COLUMNS)))
+
+        ids = self.get_ids(timestamps, volumes)
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(ids)) + 1])
+        ends = np.concatenate([starts[1:], [prices.shape[0]]])
+
+        volume = np.add.reduceat(volumes, starts)
+        price_volume = np.add.reduceat(prices * volumes, starts)
+        close = prices[ends - 1]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            vwap = np.where(volume > 0, price_volume / volume, close)
+
+        values = np.stack(
+            [
+                prices[starts],
+                np.maximum.reduceat(prices, starts),
+                np.minimum.reduceat(prices, starts),
+                close,
+                volume,
+                vwap,
+                ends - starts,
+            ],
+            axis=-1
+        ).astype(np.float64)
+        bar_timestamps = timestamps[ends - 1]
+
+        if not include_last:
+            return bar_timestamps[:-1], values[:-1]
+
+        return bar_timestamps, values
+
+
+def aggregate_ticks(
+        ticks,
+        kind='time',
+        size=60,
+        price_column='price',
+        volume_column='volume',
+        time_column=None,
+        include_last=True
+):
+    """
+    Aggregates ticks DataFrame to bars DataFrame indexed by bars timestamps, see BarAggregator.
+
+    Args:
+        ticks:          DataFrame of ticks sorted by time
+        kind:           bar type: `time`, `tick` or `volume`
+        size:           bar size, see BarAggregator
+        price_column:   ticks price column
+        volume_column:  ticks volume column, None - no volumes
+        time_column:    ticks time column, None - use index
+        include_last:   if False, drops last bar
+
+    Returns:
+        DataFrame of BAR_COLUMNS
+    """
+    timestamps = ticks.index if time_column is None else ticks[time_column]
+    bar_timestamps, values = BarAggregator(kind, size).bulk(
+        timestamps,
+        ticks[price_column].values,
+        None if volume_column is None else ticks[volume_column].values,
+        include_last=include_last,
+    )
+    if np.issubdtype(np.asarray(timestamps).dtype, np.datetime64):
+        index = pd.to_datetime(bar_timestamps)
+
+    else:
+        index = bar_timestamps
+
+    return DataFrame(values, columns=BAR_COLUMNS, index=index)
+
+
+def iterate_bars(
+        ticks,
+        kind='time',
+        size=60,
+        price_column='price',
+        volume_column='volume',
+        time_column=None,
+        include_last=True,
+        timestamps=False,
+):
+    """
+    Aggregates ticks to bars incrementally, yielding every bar as soon as it is closed.
+    Bars are emitted as values vectors ordered as BAR_COLUMNS, so output can be passed as data source
+    to StreamingMarketStepIterator with `source_columns=BAR_COLUMNS`.
+
+    Args:
+        ticks:          any source accepted by `stream.iterate_timestamped`
+        kind:           bar type: `time`, `tick` or `volume`
+        size:           bar size, see BarAggregator
+        price_column:   ticks price column
+        volume_column:  ticks volume column, None - no volumes
+        time_column:    ticks time column for DataFrame source, None - use index
+        include_last:   if True, emits last (not closed) bar when ticks source is exhausted
+        timestamps:     if True, yields (timestamp, values) pairs instead, as accepted by `stream.merge_asof`
+    """
+    aggregator = BarAggregator(kind, size)
+    columns = [price_column] if volume_column is None else [price_column, volume_column]
+    for timestamp, row in iterate_timestamped(ticks, columns=columns, time_column=time_column):
+        bar = aggregator.update(timestamp, row[0], row[1] if volume_column is not None else 0.0)
+        if bar is not None:
+            yield bar if timestamps else bar[-1]
+
+    if include_last:
+        bar = aggregator.flush()
+        if bar is not None:
+            yield bar if timestamps else bar[-1]
+
+
+class TickToBars(Kernel):
+    """
+    Aggregates ticks episode DataFrame to bars DataFrame on reset, in single vectorized pass;
+    emits bars DataFrame, to be consumed by market step iterator.
+    Bars of any resolution are built from the same ticks episode, no bars copy is kept per resolution.
+    """
+    # Bars are computed on reset only:
+    depends_on = {'step': ()}
+
+    def __init__(
+            self,
+            kind='time',
+            size=60,
+            price_column='price',
+            volume_column='volume',
+            time_column=None,
+            include_last=True,
+            name='TickToBars',
+            task=0,
+            log=None,
+            log_level=INFO,
+    ):
+        """
+
+        Args:
+            kind:           bar type: `time`, `tick` or `volume`
+            size:           bar size, see BarAggregator
+            price_column:   ticks price column
+            volume_column:  ticks volume column, None - no volumes
+            time_column:    ticks time column, None - use index
+            include_last:   if False, drops last (possibly incomplete) bar of the episode
+        """
+        super().__init__(name=name, task=task, log=log, log_level=log_level)
+        self.kind = kind
+        self.size = size
+        self.price_column = price_column
+        self.volume_column = volume_column
+        self.time_column = time_column
+        self.include_last = include_last
+
+        # Check bar specification early:
+        BarAggregator(kind, size)
+
+    def update_state(self, input_state, reset):
+        if reset:
+            try:
+                assert isinstance(input_state, DataFrame)
+
+            except AssertionError:
+                e = 'Expected ticks episode be instance of {}, got: {}'.format(DataFrame, type(input_state))
+                self.log.error(e)
+                raise TypeError(e)
+
+            self.state = aggregate_ticks(
+                input_state,
+                kind=self.kind,
+                size=self.size,
+                price_column=self.price_column,
+                volume_column=self.volume_column,
+                time_column=self.time_column,
+                include_last=self.include_last,
+            )
+            self.log.debug('aggregated {} ticks to {} bars'.format(input_state.shape[0], self.state.shape[0]))
+            self.ready = True
+
+        return self.state
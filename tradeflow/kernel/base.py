@@ -8,6 +8,7 @@ from collections import OrderedDict
 from btgym.spaces import DictSpace
 from gym import spaces
 from ..core import Kernel
+from .frame import ArrayFrame, MarketDelta
 
 import warnings
 
@@ -69,11 +70,16 @@ class CheckIfDone(Kernel):
 class StateToDictSpace(Kernel):
     """
     Maps dictionary of heterogeneous inputs to btgym.spaces.DictSpace.
+    If `contiguous` is True, emits C-contiguous arrays of observation space dtype,
+    which are passed through Ray object store as zero-copy reads.
+    Delta-encoded market state entries (MarketDelta) are passed through as is;
+    observation space describes reconstructed windows, see WindowReconstructor.
     """
     def __init__(
             self,
             space_config,
             clip=100.0,
+            contiguous=False,
             name='StateToDictSpace',
             task=0,
             log=None,
@@ -82,6 +88,7 @@ class StateToDictSpace(Kernel):
         super().__init__(name=name, task=task, log=log, log_level=log_level)
         self.space_config = space_config
         self.clip = abs(clip)
+        self.contiguous = contiguous
         self.space = self.make_observation_space(self.space_config)
 
     def make_observation_space(self, observation_shape):
@@ -97,14 +104,19 @@ class StateToDictSpace(Kernel):
         return space
 
     @staticmethod
-    def get_state(input_state, observation_space):
+    def get_state(input_state, observation_space, contiguous=False):
         if isinstance(observation_space, DictSpace):
             state = {}
             for key, space in observation_space.spaces.items():
-                state[key] = StateToDictSpace.get_state(input_state[key], space)
+                state[key] = StateToDictSpace.get_state(input_state[key], space, contiguous)
+
+        elif isinstance(input_state, MarketDelta):
+            state = input_state
 
         elif isinstance(observation_space, spaces.Box):
             state = StateToDictSpace.get_values(input_state)
+            if contiguous:
+                state = np.ascontiguousarray(state, dtype=observation_space.dtype)
             # print('i_s: {}\no_s: {}'.format(input_state, observation_space))
             # if isinstance(input_state, DataFrame):
             #     state = input_state.values
@@ -129,7 +141,7 @@ class StateToDictSpace(Kernel):
                 state[key] = StateToDictSpace.get_values(value)
 
         else:
-            if isinstance(input_state, DataFrame):
+            if isinstance(input_state, (DataFrame, ArrayFrame)):
                 state = input_state.values
 
             else:
@@ -138,7 +150,7 @@ class StateToDictSpace(Kernel):
         return state
 
     def update_state(self, input_state):
-        self.state = self.get_state(input_state, self.space)
+        self.state = self.get_state(input_state, self.space, self.contiguous)
         return self.state
 
 
@@ -170,7 +182,7 @@ class StateToBoxSpace(Kernel):
             raise NotImplementedError(e)
 
         else:
-            if isinstance(input_state, DataFrame):
+            if isinstance(input_state, (DataFrame, ArrayFrame)):
                 state = input_state.values
 
             else:
@@ -219,7 +231,7 @@ class StateToFlatSpace(Kernel):
             raise NotImplementedError(e)
 
         else:
-            if isinstance(input_state, DataFrame):
+            if isinstance(input_state, (DataFrame, ArrayFrame)):
                 state = input_state.values
 
             else:
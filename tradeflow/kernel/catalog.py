@@ -0,0 +1,186 @@
+import copy
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+
+
+class DatasetCatalog(object):
+    """
+    Indexes multiple market datasets by instrument and timestamp.
+
+    Every dataset is kept sorted by time along with its int64 timestamps array and trading session
+    boundaries, so episodes can be sampled by instrument, time window and session in O(log n)
+    by binary search, never crossing session gaps and without boolean masks over entire history.
+    """
+    def __init__(self, session_gap=None):
+        """
+
+        Args:
+            session_gap:    time gap (anything convertible to pandas.Timedelta) between consecutive rows
+                            that starts new session; None - sessions are set explicitly or dataset is single session
+        """
+        if session_gap is not None:
+            self.session_gap = pd.Timedelta(session_gap).value
+
+        else:
+            self.session_gap = None
+
+        self.datasets = OrderedDict()
+        self.timestamps = {}
+        self.sessions = {}
+        self._valid_starts = {}
+
+    def __len__(self):
+        return len(self.datasets)
+
+    def __getitem__(self, instrument):
+        return self.datasets[instrument]
+
+    @property
+    def instruments(self):
+        return list(self.datasets.keys())
+
+    @staticmethod
+    def to_timestamp(value):
+        return pd.Timestamp(value).value
+
+    def map(self, fn):
+        """
+        Returns shallow copy of the catalog with `fn` applied to every dataset;
+        `fn` should preserve rows order and number.
+        """
+        catalog = copy.copy(self)
+        catalog.datasets = OrderedDict([(key, fn(value)) for key, value in self.datasets.items()])
+        return catalog
+
+    def add(self, instrument, dataframe, time_column=None, session_column=None):
+        """
+        Adds dataset to catalog.
+
+        Args:
+            instrument:         instrument name
+            dataframe:          pandas DataFrame
+            time_column:        name of column holding timestamps; if None - dataframe index is used
+            session_column:     name of column holding session labels; if None - sessions are split by `session_gap`
+        """
+        if time_column is None:
+            timestamps = pd.to_datetime(dataframe.index)
+
+        else:
+            timestamps = pd.to_datetime(dataframe[time_column])
+
+        timestamps = np.asarray(timestamps, dtype='datetime64[ns]').view(np.int64)
+
+        if (np.diff(timestamps) < 0).any():
+            order = np.argsort(timestamps, kind='mergesort')
+            timestamps = timestamps[order]
+            dataframe = dataframe.iloc[order]
+
+        if session_column is not None:
+            labels = dataframe[session_column].values
+            boundaries = np.flatnonzero(labels[1:] != labels[:-1]) + 1
+
+        elif self.session_gap is not None:
+            boundaries = np.flatnonzero(np.diff(timestamps) > self.session_gap) + 1
+
+        else:
+            boundaries = np.zeros(0, dtype=np.int64)
+
+        self.datasets[instrument] = dataframe
+        self.timestamps[instrument] = timestamps
+        self.sessions[instrument] = (
+            np.concatenate([[0], boundaries]).astype(np.int64),
+            np.concatenate([boundaries, [timestamps.shape[0]]]).astype(np.int64),
+        )
+        self._valid_starts = {key: value for key, value in self._valid_starts.items() if key[0] != instrument}
+
+        return self
+
+    def locate(self, instrument, start=None, end=None):
+        """
+        Returns [low, high) row positions range of instrument dataset within [start, end) time window.
+        """
+        timestamps = self.timestamps[instrument]
+        low = 0 if start is None else int(np.searchsorted(timestamps, self.to_timestamp(start), side='left'))
+        high = timestamps.shape[0] if end is None else int(
+            np.searchsorted(timestamps, self.to_timestamp(end), side='left')
+        )
+        return low, high
+
+    def valid_starts(self, instrument, sample_length, start=None, end=None):
+        """
+        Returns sessions clipped to time window: start positions, and cumulative number of valid
+        episode start pointers, such that entire episode fits into single session.
+        Cached per instrument, episode length and time window.
+        """
+        key = (instrument, sample_length, start, end)
+        if key not in self._valid_starts:
+            low, high = self.locate(instrument, start, end)
+            session_starts, session_ends = self.sessions[instrument]
+            first = np.searchsorted(session_ends, low, side='right')
+            last = np.searchsorted(session_starts, high, side='left')
+            starts = np.maximum(session_starts[first:last], low)
+            ends = np.minimum(session_ends[first:last], high)
+            if sample_length > 0:
+                counts = np.maximum(ends - starts - sample_length + 1, 0)
+
+            else:
+                # Whole sessions:
+                counts = (ends > starts).astype(np.int64)
+
+            self._valid_starts[key] = (starts, ends, np.cumsum(counts))
+
+        return self._valid_starts[key]
+
+    def sample(self, sample_length, instrument=None, start=None, end=None, rng=None):
+        """
+        Samples episode uniformly over all valid start positions.
+
+        Args:
+            sample_length:  episode length in rows; if not positive - samples entire session
+            instrument:     instrument name or list of names to sample from; None - any instrument
+            start:          time window start, anything convertible to pandas.Timestamp
+            end:            time window end (exclusive)
+            rng:            instance of numpy.random.RandomState; None - global numpy random state
+
+        Returns:
+            instrument name, episode DataFrame
+        """
+        if rng is None:
+            rng = np.random
+
+        if instrument is None:
+            instruments = self.instruments
+
+        elif isinstance(instrument, (list, tuple)):
+            instruments = list(instrument)
+
+        else:
+            instruments = [instrument]
+
+        totals = np.asarray(
+            [self.valid_starts(name, sample_length, start, end)[-1][-1:].sum() for name in instruments]
+        )
+        if totals.sum() == 0:
+            raise ValueError(
+                'No episodes of length {} found for instruments {} within [{}, {})'.format(
+                    sample_length, instruments, start, end
+                )
+            )
+
+        pointer = rng.randint(totals.sum())
+        cumulative_totals = np.cumsum(totals)
+        i = int(np.searchsorted(cumulative_totals, pointer, side='right'))
+        pointer -= cumulative_totals[i] - totals[i]
+
+        starts, ends, cumulative_counts = self.valid_starts(instruments[i], sample_length, start, end)
+        session = int(np.searchsorted(cumulative_counts, pointer, side='right'))
+        if sample_length > 0:
+            offset = pointer - (cumulative_counts[session - 1] if session > 0 else 0)
+            low = starts[session] + offset
+            high = low + sample_length
+
+        else:
+            low, high = starts[session], ends[session]
+
+        return instruments[i], copy.copy(self.datasets[instruments[i]].iloc[low: high])
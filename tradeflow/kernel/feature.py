@@ -0,0 +1,361 @@
+from logbook import INFO
+import numpy as np
+from pandas import DataFrame, Series
+from collections import namedtuple, OrderedDict
+
+from ..core import Kernel
+from .frame import RingBuffer
+
+
+FeatureConfig = namedtuple('FeatureConfig', ['column', 'feature', 'kwargs'])
+
+
+class RollingFeature(object):
+    """
+    Base incremental feature estimator.
+    Defines feature both as running O(1) per step update (streaming mode)
+    and as vectorized computation over entire series (batch mode); both give same values.
+    Values are NaN until enough observations are seen.
+    """
+    def __init__(self, window):
+        try:
+            assert int(window) > 0
+
+        except AssertionError:
+            raise ValueError('Expected positive `window`, got: {}'.format(window))
+
+        self.window = int(window)
+        self.buffer = RingBuffer(self.window, 1)
+
+    def reset(self):
+        self.buffer.reset()
+
+    def update(self, value):
+        self.buffer.push(value)
+        return self.value()
+
+    def value(self):
+        raise NotImplementedError
+
+    def batch(self, values):
+        raise NotImplementedError
+
+    def _pad(self, values, length):
+        """
+        Prepends NaN's to values computed over full windows only.
+        """
+        return np.concatenate([np.full(length - values.shape[0], np.nan), values])
+
+
+class RollingSum(RollingFeature):
+    """
+    Sum over last `window` values.
+    Running sum is updated by Kahan compensated remove/add steps, same as pandas rolling sum,
+    so long series far from zero (e.g. price levels) do not accumulate rounding error.
+    """
+    def __init__(self, window):
+        super().__init__(window)
+        self.sum = 0.0
+        self.compensation_add = 0.0
+        self.compensation_remove = 0.0
+
+    def reset(self):
+        super().reset()
+        self.sum = 0.0
+        self.compensation_add = 0.0
+        self.compensation_remove = 0.0
+
+    def update(self, value):
+        if self.buffer.full:
+            removed = self.buffer.window()[0, 0]
+            self.sum, self.compensation_remove = self._add(self.sum, -removed, self.compensation_remove)
+
+        self.sum, self.compensation_add = self._add(self.sum, value, self.compensation_add)
+        return super().update(value)
+
+    @staticmethod
+    def _add(total, value, compensation):
+        value = value - compensation
+        result = total + value
+        return result, (result - total) - value
+
+    def value(self):
+        if self.buffer.full:
+            return self.sum
+
+        else:
+            return np.nan
+
+    def batch(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        return Series(values).rolling(self.window).sum().values
+
+
+class SMA(RollingSum):
+    """
+    Simple moving average over last `window` values.
+    """
+    def value(self):
+        return super().value() / self.window
+
+    def batch(self, values):
+        return super().batch(values) / self.window
+
+
+class RollingZScore(RollingFeature):
+    """
+    Z-score of the last value with respect to mean and standard deviation over last `window` values.
+    Running mean and sum of squared deviations are updated by Welford's add/remove steps,
+    so values far from zero (e.g. price levels) do not lose precision.
+    """
+    def __init__(self, window):
+        super().__init__(window)
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.last = np.nan
+
+    def reset(self):
+        super().reset()
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.last = np.nan
+
+    def update(self, value):
+        if self.buffer.full:
+            removed = self.buffer.window()[0, 0]
+            mean = self.mean + (value - removed) / self.window
+            self.m2 += (value - removed) * (value - mean + removed - self.mean)
+            self.mean = mean
+
+        else:
+            self.count += 1
+            delta = value - self.mean
+            self.mean += delta / self.count
+            self.m2 += delta * (value - self.mean)
+
+        self.last = value
+        return super().update(value)
+
+    def value(self):
+        if self.buffer.full:
+            return self._zscore(self.last, self.mean, np.sqrt(max(self.m2, 0.0) / self.window))
+
+        else:
+            return np.nan
+
+    @staticmethod
+    def _zscore(value, mean, std):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            zscore = np.where(std > 0, (value - mean) / std, 0.0)
+
+        return np.where(np.isnan(mean), np.nan, zscore)[()]
+
+    def batch(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        rolling = Series(values).rolling(self.window)
+        return self._zscore(values, rolling.mean().values, rolling.std(ddof=0).values)
+
+
+class EMA(RollingFeature):
+    """
+    Exponential moving average with smoothing factor `alpha` or, equivalently, `span`: alpha = 2 / (span + 1).
+    """
+    def __init__(self, span=None, alpha=None):
+        if alpha is None:
+            try:
+                assert span is not None and span >= 1
+
+            except AssertionError:
+                raise ValueError('Expected either `span` >= 1 or `alpha` be set, got: {}, {}'.format(span, alpha))
+
+            alpha = 2.0 / (span + 1.0)
+
+        super().__init__(window=1)
+        self.alpha = alpha
+        self.mean = np.nan
+
+    def reset(self):
+        self.mean = np.nan
+
+    def update(self, value):
+        if np.isnan(self.mean):
+            self.mean = value
+
+        else:
+            self.mean += self.alpha * (value - self.mean)
+
+        return self.mean
+
+    def value(self):
+        return self.mean
+
+    def batch(self, values):
+        return Series(np.asarray(values, dtype=np.float64)).ewm(alpha=self.alpha, adjust=False).mean().values
+
+
+class ALMA(RollingFeature):
+    """
+    Arnaud Legoux moving average: gaussian-weighted average over last `window` values,
+    centered at `offset` fraction of the window with width defined by `sigma`.
+    Update costs single dot product over contiguous ring buffer window.
+    """
+    def __init__(self, window, offset=0.85, sigma=6.0):
+        super().__init__(window)
+        m = offset * (self.window - 1)
+        s = self.window / sigma
+        weights = np.exp(- (np.arange(self.window) - m) ** 2 / (2 * s ** 2))
+        self.weights = weights / weights.sum()
+
+    def value(self):
+        if self.buffer.full:
+            return np.dot(self.weights, self.buffer.window()[:, 0])
+
+        else:
+            return np.nan
+
+    def batch(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if values.shape[0] < self.window:
+            return np.full(values.shape[0], np.nan)
+
+        return self._pad(np.convolve(values, self.weights[::-1], mode='valid'), values.shape[0])
+
+
+class Return(RollingFeature):
+    """
+    Return over `horizon` steps: simple (x_t / x_t-h - 1) or logarithmic (log(x_t / x_t-h)).
+    """
+    def __init__(self, horizon=1, log=False):
+        super().__init__(window=horizon + 1)
+        self.horizon = horizon
+        self.log = log
+
+    def _return(self, value, base):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if self.log:
+                return np.log(value / base)
+
+            else:
+                return value / base - 1
+
+    def value(self):
+        if self.buffer.full:
+            window = self.buffer.window()
+            return self._return(window[-1, 0], window[0, 0])
+
+        else:
+            return np.nan
+
+    def batch(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if values.shape[0] <= self.horizon:
+            return np.full(values.shape[0], np.nan)
+
+        return self._pad(self._return(values[self.horizon:], values[:-self.horizon]), values.shape[0])
+
+
+def make_features(feature_config):
+    """
+    Instantiates feature estimators.
+
+    Args:
+        feature_config:     dictionary of FeatureConfig instances keyed by feature names
+
+    Returns:
+        OrderedDict of (column name, estimator instance) tuples keyed by feature names
+    """
+    features = OrderedDict()
+    for name, config in feature_config.items():
+        try:
+            assert isinstance(config, FeatureConfig)
+
+        except AssertionError:
+            raise TypeError('Expected feature config be instance of {}, got: {}'.format(FeatureConfig, type(config)))
+
+        features[name] = (config.column, config.feature(**(config.kwargs or {})))
+
+    return features
+
+
+def compute_features(dataframe, feature_config):
+    """
+    Batch mode: computes features over entire dataset in vectorized manner, e.g. to precompute dataset offline.
+
+    Args:
+        dataframe:          pandas DataFrame holding source columns
+        feature_config:     dictionary of FeatureConfig instances keyed by feature names
+
+    Returns:
+        pandas DataFrame of features, indexed as source dataframe
+    """
+    features = make_features(feature_config)
+    return DataFrame(
+        OrderedDict(
+            [(name, feature.batch(dataframe[column].values)) for name, (column, feature) in features.items()]
+        ),
+        index=dataframe.index,
+    )
+
+
+class IncrementalFeatures(Kernel):
+    """
+    Computes rolling features from running state, O(1) per step per feature.
+    Expects market state window (DataFrame or ArrayFrame holding source columns) or single row mapping as input:
+    on reset, estimators are warmed up with entire window; on every step only the newest row is consumed.
+    Same feature definitions are available in batch mode via `compute_features` function.
+    """
+    def __init__(
+            self,
+            feature_config,
+            name='IncrementalFeatures',
+            task=0,
+            log=None,
+            log_level=INFO,
+    ):
+        super().__init__(name=name, task=task, log=log, log_level=log_level)
+        self.feature_config = feature_config
+        try:
+            self.features = make_features(self.feature_config)
+
+        except (TypeError, ValueError) as e:
+            self.log.error(e)
+            raise e
+
+    @staticmethod
+    def get_column(input_state, column):
+        if hasattr(input_state, 'values') and not isinstance(input_state, (dict, Series)):
+            return np.ravel(input_state[column].values)
+
+        else:
+            return np.ravel(np.asarray(input_state[column], dtype=np.float64))
+
+    def update_state(self, input_state, reset):
+        if reset:
+            self._start(input_state)
+
+        else:
+            self._update_state(input_state)
+
+        return self.state
+
+    def _start(self, input_state):
+        self.state = OrderedDict()
+        for name, (column, feature) in self.features.items():
+            feature.reset()
+            value = np.nan
+            for value in self.get_column(input_state, column):
+                value = feature.update(value)
+
+            self.state[name] = value
+
+        self.ready = True
+
+    def _update_state(self, input_state):
+        self.state = OrderedDict(
+            [
+                (name, feature.update(self.get_column(input_state, column)[-1]))
+                for name, (column, feature) in self.features.items()
+            ]
+        )
@@ -0,0 +1,216 @@
+import numpy as np
+from pandas import DataFrame
+from collections import namedtuple
+
+try:
+    import pyarrow as pa
+
+except ImportError:
+    pa = None
+
+
+class ArrayFrame(object):
+    """
+    Transport-friendly container for 2D market data windows.
+
+    Holds single contiguous numpy buffer along with column labels and row index.
+    Unlike pandas DataFrame it serializes as plain numpy arrays, so Ray object store can hand
+    values to consumers as zero-copy reads. Conversion back to DataFrame is optional and lazy.
+    Exposes `.values`, `.columns`, `.shape` and column selection, so it can be used in place of
+    DataFrame by kernels reading only raw values.
+    """
+    __slots__ = ('values', 'columns', 'index', '_frame')
+
+    def __init__(self, values, columns, index=None):
+        values = np.ascontiguousarray(values)
+        if values.ndim == 1:
+            values = values.reshape(-1, len(columns))
+
+        self.values = values
+        self.columns = list(columns)
+        self.index = index
+        self._frame = None
+
+    @classmethod
+    def from_frame(cls, dataframe):
+        return cls(dataframe.values, dataframe.columns, dataframe.index.values)
+
+    @classmethod
+    def from_arrow(cls, record_batch):
+        values = np.stack([column.to_numpy(zero_copy_only=False) for column in record_batch.columns], axis=-1)
+        return cls(values, record_batch.schema.names)
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    def __len__(self):
+        return self.values.shape[0]
+
+    def __getitem__(self, key):
+        """
+        Selects column or list of columns; returns instance of ArrayFrame.
+        """
+        if isinstance(key, (list, tuple)):
+            columns = list(key)
+
+        else:
+            columns = [key]
+
+        try:
+            positions = [self.columns.index(column) for column in columns]
+
+        except ValueError:
+            raise KeyError('Expected columns from {}, got: {}'.format(self.columns, key))
+
+        return ArrayFrame(self.values[:, positions], columns, self.index)
+
+    def __reduce__(self):
+        # Do not ship cached DataFrame, only raw buffers:
+        return self.__class__, (self.values, self.columns, self.index)
+
+    def __repr__(self):
+        return '<ArrayFrame: shape={}, columns={}>'.format(self.values.shape, self.columns)
+
+    def to_frame(self):
+        """
+        Returns pandas DataFrame view of the data, built once on first call.
+        """
+        if self._frame is None:
+            self._frame = DataFrame(self.values, columns=self.columns, index=self.index, copy=False)
+
+        return self._frame
+
+    def to_arrow(self):
+        """
+        Returns data as pyarrow.RecordBatch, one column per feature.
+        """
+        if pa is None:
+            raise ImportError('Converting to Arrow record batches requires `pyarrow` package installed')
+
+        return pa.RecordBatch.from_arrays(
+            [pa.array(self.values[:, i]) for i in range(self.values.shape[-1])],
+            names=[str(column) for column in self.columns]
+        )
+
+
+class RingBuffer(object):
+    """
+    Fixed-size buffer holding last `depth` rows of `width` values.
+
+    Every row is written twice, `depth` positions apart, so the ordered window
+    of last rows is always available as single contiguous view without copying or rolling.
+    """
+    def __init__(self, depth, width, dtype=np.float64):
+        self.depth = depth
+        self.width = width
+        self.buffer = np.zeros((2 * depth, width), dtype=dtype)
+        self.pointer = 0
+        self.count = 0
+
+    def reset(self):
+        self.buffer[:] = 0
+        self.pointer = 0
+        self.count = 0
+
+    @property
+    def full(self):
+        return self.count >= self.depth
+
+    def push(self, row):
+        self.buffer[self.pointer] = row
+        self.buffer[self.pointer + self.depth] = row
+        self.pointer = (self.pointer + 1) % self.depth
+        self.count += 1
+
+    def window(self):
+        """
+        Returns view of last `depth` rows, oldest first.
+        """
+        return self.buffer[self.pointer: self.pointer + self.depth]
+
+
+# Delta-encoded market state window: step sequence number, newest row values
+# or, for keyframe, entire window values:
+MarketDelta = namedtuple('MarketDelta', ['seq', 'values', 'keyframe'])
+
+
+def encode_delta(state, seq, dtype=None):
+    """
+    Substitutes every window (DataFrame or ArrayFrame) leaf of possibly nested dictionary state
+    with MarketDelta holding its newest row; first step of the episode (`seq` == 1) emits entire window as keyframe.
+    """
+    if isinstance(state, dict):
+        return {key: encode_delta(value, seq, dtype) for key, value in state.items()}
+
+    keyframe = seq == 1
+    values = state.values if keyframe else state.values[-1]
+    if dtype is not None:
+        values = values.astype(dtype)
+
+    return MarketDelta(seq, values, keyframe)
+
+
+class WindowReconstructor(object):
+    """
+    Consumer-side counterpart of delta-encoded market state:
+    rebuilds full windows from MarketDelta entries of (possibly nested dictionary) observations
+    by keeping local ring buffer per entry. Other entries are passed through.
+    Raises ValueError if delta sequence has gaps, i.e. some step observation was lost.
+    """
+    def __init__(self, dtype=np.float32, copy=True):
+        """
+
+        Args:
+            dtype:  reconstructed windows dtype
+            copy:   if False, windows are returned as views of ring buffers, valid until next update
+        """
+        self.dtype = dtype
+        self.copy = copy
+        self.buffers = {}
+        self.seq = {}
+
+    def update(self, observation, path=()):
+        """
+        Consumes observation, returns it with MarketDelta entries substituted by windows.
+        """
+        if isinstance(observation, dict):
+            return {key: self.update(value, path + (key,)) for key, value in observation.items()}
+
+        elif not isinstance(observation, MarketDelta):
+            return observation
+
+        if observation.keyframe:
+            window = np.asarray(observation.values)
+            buffer = self.buffers.get(path, None)
+            if buffer is None or buffer.buffer.shape[-1] != window.shape[-1] or buffer.depth != window.shape[0]:
+                buffer = self.buffers[path] = RingBuffer(window.shape[0], window.shape[-1], dtype=self.dtype)
+
+            buffer.reset()
+            for row in window:
+                buffer.push(row)
+
+        else:
+            try:
+                assert path in self.buffers
+
+            except AssertionError:
+                raise ValueError('Got delta before keyframe for observation entry {}'.format(path))
+
+            if observation.seq == self.seq[path]:
+                # Repeated state, nothing new:
+                pass
+
+            elif observation.seq == self.seq[path] + 1:
+                self.buffers[path].push(observation.values)
+
+            else:
+                raise ValueError(
+                    'Delta sequence gap for observation entry {}: expected {}, got {}'.format(
+                        path, self.seq[path] + 1, observation.seq
+                    )
+                )
+
+        self.seq[path] = observation.seq
+        window = self.buffers[path].window()
+        return window.copy() if self.copy else window
@@ -3,8 +3,12 @@ import sys
 import copy
 
 import numpy as np
+from pandas import DataFrame
 from collections import namedtuple
 from ..core import Kernel
+from .frame import ArrayFrame, RingBuffer, encode_delta
+from .sampler import AliasSampler
+from .stream import iterate_rows, merge_asof, merged_columns
 # from ..kernel.base import PandasStateConfig
 
 import warnings
@@ -13,25 +17,101 @@ if not sys.warnoptions:
     warnings.simplefilter("ignore")
 
 
-PandasStateConfig = namedtuple('PandasStateConfig', ['columns', 'depth'])
+PandasStateConfig = namedtuple('PandasStateConfig', ['columns', 'depth', 'stride', 'aggregation'])
+# Contiguous window at dataset resolution by default:
+PandasStateConfig.__new__.__defaults__ = (1, None)
+PandasStateConfig.__doc__ = """
+Market state window specification.
+
+Window holds `depth` rows, each spanning `stride` dataset rows, i.e. covers last `depth * stride` rows.
+With `stride` > 1 row values are either taken from every `stride`-th row (`aggregation` None or `last`),
+averaged over `stride` rows (`mean`) or summarized as open, high, low, close of every column (`ohlc`);
+latter emits columns named `column_open`, `column_high`, etc., see `state_columns`.
+"""
+
+AGGREGATIONS = (None, 'last', 'mean', 'ohlc')
+OHLC_FIELDS = ('open', 'high', 'low', 'close')
+
+
+def state_columns(state_config):
+    """
+    Returns columns of window emitted for PandasStateConfig instance.
+    """
+    if state_config.aggregation == 'ohlc':
+        return ['{}_{}'.format(column, field) for column in state_config.columns for field in OHLC_FIELDS]
+
+    return list(state_config.columns)
+
+
+def is_multiscale(state_config):
+    """
+    True if any window of (possibly nested dictionary) state config is not contiguous slice of dataset rows.
+    """
+    if isinstance(state_config, dict):
+        return any(is_multiscale(value) for value in state_config.values())
+
+    return state_config.stride > 1 or state_config.aggregation == 'ohlc'
+
+
+def aggregate_window(window, stride, aggregation):
+    """
+    Aggregates contiguous 2d window of `depth * stride` rows to `depth` rows, see PandasStateConfig.
+    """
+    blocks = window.reshape(-1, stride, window.shape[-1])
+    if aggregation == 'mean':
+        return blocks.mean(axis=1)
+
+    elif aggregation == 'ohlc':
+        return np.stack(
+            [blocks[:, 0], blocks.max(axis=1), blocks.min(axis=1), blocks[:, -1]],
+            axis=-1
+        ).reshape(blocks.shape[0], -1)
+
+    else:
+        return blocks[:, -1]
 
 
 class PandasMarketEpisodeIterator(Kernel):
     """
     Samples episodes from pandas dataset.
+
+    Episode start rows are drawn either uniformly or, if `weights` are given, proportionally to per-row weights
+    (e.g. realized volatility, recency or priorities) by alias table sampler in O(1) per draw.
+    Weights can be updated incrementally via `update_weights`. Kernel draws from its own random state.
     """
+    # Does nothing on step:
+    depends_on = {'step': ()}
+
     def __init__(
             self,
+            weights=None,
+            block_size=None,
+            seed=None,
             name='MarketDataEpisodeIterator',
             task=0,
             log=None,
             log_level=INFO,
             ):
+        """
+
+        Args:
+            weights:        episode start weights: array of dataset length or name of dataset column;
+                            None - uniform sampling
+            block_size:     alias sampler block size, see AliasSampler
+            seed:           random seed of this kernel random state
+        """
         super().__init__(name=name, task=task, log=log, log_level=log_level)
         self.dataframe = None
         self.iterations = 0
         self.pn = 0
 
+        self.weights = weights
+        self.block_size = block_size
+        self.rng = np.random.RandomState(seed)
+        self.sampler = None
+        # Dataset and number of valid start rows sampler is built for:
+        self.sampler_key = None
+
     def update_state(self, input_state, reset, sample_length):
         self.dataframe = input_state
 
@@ -43,6 +123,49 @@ class PandasMarketEpisodeIterator(Kernel):
         else:
             return None
 
+    def get_weights(self):
+        if isinstance(self.weights, str):
+            return self.dataframe[self.weights].values
+
+        weights = np.asarray(self.weights, dtype=np.float64)
+        try:
+            assert weights.shape[0] == self.dataframe.shape[0]
+
+        except AssertionError:
+            e = 'Expected weights be of dataset length {}, got: {}'.format(self.dataframe.shape[0], weights.shape[0])
+            self.log.error(e)
+            raise ValueError(e)
+
+        return weights
+
+    def get_sampler(self, high):
+        """
+        Returns alias sampler over first `high` rows weights, rebuilt only if dataset or episode length changed.
+        """
+        key = (id(self.dataframe), self.dataframe.shape[0], high)
+        if self.sampler is None or key != self.sampler_key:
+            self.sampler = AliasSampler(self.get_weights()[:high], block_size=self.block_size, rng=self.rng)
+            self.sampler_key = key
+
+        return self.sampler
+
+    def update_weights(self, indices, weights):
+        """
+        Sets new episode start weights for given rows.
+        """
+        if self.weights is None or isinstance(self.weights, str):
+            e = 'Expected weights be set as array to be updated, got: {}'.format(self.weights)
+            self.log.error(e)
+            raise ValueError(e)
+
+        indices = np.asarray(indices, dtype=np.int64)
+        self.weights = np.array(self.weights, dtype=np.float64)
+        self.weights[indices] = weights
+
+        if self.sampler is not None:
+            valid = indices < self.sampler.size
+            self.sampler.update(indices[valid], np.broadcast_to(weights, indices.shape)[valid])
+
     def sample(self, sample_length):
         self.log.debug('sample #{}'.format(self.iterations))
         try:
@@ -66,7 +189,12 @@ class PandasMarketEpisodeIterator(Kernel):
                 low=0,
                 high=1,
             )
-        start_pointer = np.random.randint(**sample_start_interval)
+        if self.weights is None:
+            start_pointer = self.rng.randint(**sample_start_interval)
+
+        else:
+            start_pointer = self.get_sampler(sample_start_interval['high']).sample()
+
         self.log.debug(
             'sample start: {}, end: {}, len: {}'.format(start_pointer, start_pointer + sample_length, sample_length)
         )
@@ -74,24 +202,142 @@ class PandasMarketEpisodeIterator(Kernel):
         return copy.copy(self.dataframe.loc[start_pointer: start_pointer + sample_length - 1])
 
 
+class CatalogEpisodeIterator(Kernel):
+    """
+    Samples episodes from DatasetCatalog by instrument and time window, never crossing session boundaries.
+    """
+    # Does nothing on step:
+    depends_on = {'step': ()}
+
+    def __init__(
+            self,
+            instrument=None,
+            start=None,
+            end=None,
+            seed=None,
+            name='CatalogEpisodeIterator',
+            task=0,
+            log=None,
+            log_level=INFO,
+            ):
+        """
+
+        Args:
+            instrument:     instrument name or list of names to sample from; None - any instrument
+            start:          time window start, anything convertible to pandas.Timestamp
+            end:            time window end (exclusive)
+            seed:           random seed of this kernel random state
+        """
+        super().__init__(name=name, task=task, log=log, log_level=log_level)
+        self.instrument = instrument
+        self.start = start
+        self.end = end
+        self.rng = np.random.RandomState(seed)
+        self.catalog = None
+        self.iterations = 0
+        self.sampled_instrument = None
+
+    def update_state(self, input_state, reset, sample_length):
+        self.catalog = input_state
+
+        if reset:
+            try:
+                self.sampled_instrument, self.state = self.catalog.sample(
+                    sample_length,
+                    instrument=self.instrument,
+                    start=self.start,
+                    end=self.end,
+                    rng=self.rng,
+                )
+
+            except ValueError as e:
+                self.log.error(e)
+                raise e
+
+            self.log.debug(
+                'sample #{}: instrument: {}, len: {}'.format(
+                    self.iterations, self.sampled_instrument, self.state.shape[0]
+                )
+            )
+            self.iterations += 1
+            return self.state
+
+        else:
+            return None
+
+
 class PandasMarketStepIterator(Kernel):
+    """
+    Iterates over episode dataframe step-by-step, emits market state as specified by `state_config`.
+
+    Market state leaves are emitted either as pandas DataFrame slices (`transport='pandas'`) or
+    as ArrayFrame views of contiguous numpy buffers (`transport='numpy'`); latter is preferable for
+    remote kernels as it is passed through Ray object store without pickling overhead.
+
+    State entries listed in `delta_keys` are emitted delta-encoded: as MarketDelta holding the newest row only
+    (entire window at the first step of the episode), optionally cast to `delta_dtype` (e.g. np.float16);
+    use WindowReconstructor at consumer side to rebuild windows.
+
+    Downsampled windows (see PandasStateConfig `stride` and `aggregation`) are computed from buffers prepared
+    once per episode: strided ones are taken as strided views, means come from prefix sums
+    and OHLC from rolling highs and lows, so step cost depends on window `depth` only, not on covered rows number.
+    """
+    transports = ('pandas', 'numpy')
 
     def __init__(
             self,
             state_config,
+            transport='pandas',
+            delta_keys=None,
+            delta_dtype=None,
             name='MarketDataStepIterator',
             task=0,
             log=None,
             log_level=INFO,
     ):
         super().__init__(name=name, task=task, log=log, log_level=log_level)
+        try:
+            assert transport in self.transports
+
+        except AssertionError:
+            e = 'Expected `transport` be one of {}, got: {}'.format(self.transports, transport)
+            self.log.error(e)
+            raise ValueError(e)
+
         self.data_length = None
         self.state_config = state_config
+        self.transport = transport
+        self.delta_keys = delta_keys or []
+        self.delta_dtype = delta_dtype
+
+        try:
+            assert isinstance(self.state_config, dict) or len(self.delta_keys) == 0
+            assert all(key in self.state_config for key in self.delta_keys)
+
+        except AssertionError:
+            e = 'Expected `delta_keys` be keys of `state_config`, got: {}'.format(self.delta_keys)
+            self.log.error(e)
+            raise ValueError(e)
 
         self.dataframe = None
+        self.arrays = None
+        self.prefix_sums = None
+        self.rolling_extremes = None
+        self.index = None
         self.start_pointer = None
         self.sample_max_depth = self.get_max_depth(self.state_config)
 
+        try:
+            # Downsampled windows shift by block every `stride` steps, not by row every step:
+            assert not any(is_multiscale(self.state_config[key]) for key in self.delta_keys)
+
+        except AssertionError:
+            e = 'Expected `delta_keys` windows be contiguous (stride=1, no OHLC aggregation), got: {}'.format(
+                self.delta_keys
+            )
+            self.log.error(e)
+            raise ValueError(e)
+
     def get_max_depth(self, state_config):
         if isinstance(state_config, dict):
             depth = []
@@ -108,20 +354,115 @@ class PandasMarketStepIterator(Kernel):
                 self.log.error(e)
                 raise TypeError(e)
 
-            return state_config.depth
+            try:
+                assert int(state_config.stride) == state_config.stride >= 1
+                assert state_config.aggregation in AGGREGATIONS
+
+            except AssertionError:
+                e = 'Expected positive integer `stride` and `aggregation` from {}, got: {} and {}'.format(
+                    AGGREGATIONS, state_config.stride, state_config.aggregation
+                )
+                self.log.error(e)
+                raise ValueError(e)
+
+            return state_config.depth * state_config.stride
 
     @staticmethod
     def get_data_slice(dataframe, columns, depth, position):
         return dataframe[columns][position - depth: position]
 
+    def get_array_slice(self, columns, depth, position):
+        return ArrayFrame(
+            self.arrays[tuple(columns)][position - depth: position],
+            columns,
+            self.index[position - depth: position],
+        )
+
+    def get_multiscale_values(self, columns, depth, stride, aggregation, position):
+        key = tuple(columns)
+        start = position - depth * stride
+        # Last rows of every block:
+        ends = slice(start + stride - 1, position, stride)
+
+        if aggregation == 'mean':
+            sums = self.prefix_sums[key]
+            values = (sums[start + stride: position + 1: stride] - sums[start: position + 1 - stride: stride]) / stride
+
+        elif aggregation == 'ohlc':
+            highs, lows = self.rolling_extremes[(key, stride)]
+            values = np.stack(
+                [self.arrays[key][start: position: stride], highs[ends], lows[ends], self.arrays[key][ends]],
+                axis=-1
+            ).reshape(depth, -1)
+
+        else:
+            values = self.arrays[key][ends]
+
+        return values, self.index[ends]
+
+    def get_multiscale_slice(self, state_config, position):
+        values, index = self.get_multiscale_values(*state_config, position)
+        if self.transport == 'numpy':
+            return ArrayFrame(values, state_columns(state_config), index)
+
+        else:
+            return DataFrame(values, columns=state_columns(state_config), index=index)
+
+    def get_arrays(self, state_config, arrays=None):
+        """
+        Extracts contiguous value buffer for every state leaf, once per episode;
+        also prepares prefix sums and rolling extremes for aggregated leaves.
+        With `pandas` transport only downsampled leaves are served from buffers.
+        """
+        if arrays is None:
+            arrays = {}
+            self.prefix_sums = {}
+            self.rolling_extremes = {}
+
+        if isinstance(state_config, dict):
+            for value in state_config.values():
+                self.get_arrays(value, arrays)
+
+        elif self.transport == 'numpy' or is_multiscale(state_config):
+            key = tuple(state_config.columns)
+            if key not in arrays:
+                arrays[key] = np.ascontiguousarray(self.dataframe[state_config.columns].values)
+
+            if state_config.aggregation == 'mean' and key not in self.prefix_sums:
+                sums = np.zeros((arrays[key].shape[0] + 1, arrays[key].shape[-1]))
+                np.cumsum(arrays[key], axis=0, out=sums[1:])
+                self.prefix_sums[key] = sums
+
+            elif state_config.aggregation == 'ohlc' and (key, state_config.stride) not in self.rolling_extremes:
+                rolling = DataFrame(arrays[key]).rolling(state_config.stride, min_periods=1)
+                self.rolling_extremes[(key, state_config.stride)] = (
+                    np.ascontiguousarray(rolling.max().values),
+                    np.ascontiguousarray(rolling.min().values),
+                )
+
+        return arrays
+
     def get_state(self, position, state_config):
         if isinstance(state_config, dict):
             state = {key: self.get_state(position, value) for key, value in state_config.items()}
+
+        elif is_multiscale(state_config):
+            state = self.get_multiscale_slice(state_config, position)
+
+        elif self.transport == 'numpy':
+            state = self.get_array_slice(state_config.columns, state_config.depth, position)
+
         else:
             state = self.get_data_slice(self.dataframe, state_config.columns, state_config.depth, position)
 
         return state
 
+    def encode_deltas(self, state):
+        for key in self.delta_keys:
+            state[key] = encode_delta(state[key], self.iter_passed, self.delta_dtype)
+
+        return state
+
     def update_state(self, input_state, reset):
         if reset:
             self._start(input_state)
@@ -135,6 +476,9 @@ class PandasMarketStepIterator(Kernel):
         self.log.debug('got data source of type: {}'.format(type(self.dataframe)))
         self.log.debug('got data source of shape: {}'.format(self.dataframe.values.shape))
         self.data_length = self.dataframe.values.shape[0]
+        self.arrays = self.get_arrays(self.state_config)
+        self.index = self.dataframe.index.values
+
         self.start_pointer = self.sample_max_depth
         self.iter_passed = 0
         self.ready = True
@@ -154,6 +498,7 @@ class PandasMarketStepIterator(Kernel):
                     self.ready
                 )
             )
+            self.state = self.encode_deltas(self.state)
             self.state['ready'] = self.ready
             return self.state
 
@@ -161,3 +506,303 @@ class PandasMarketStepIterator(Kernel):
             msg = 'Attempt to iterate uninitialised data / go beyond sample length.\nHint: forgot to check .ready flag?'
             self.log.error(msg)
             raise IndexError(msg)
+
+
+class StreamingMarketStepIterator(PandasMarketStepIterator):
+    """
+    Iterates over market data rows arriving incrementally from generator, csv file tail or local queue.
+    Keeps only last `depth * stride` rows per state leaf in fixed-size ring buffers, so memory is bounded
+    for arbitrarily long or unbounded feeds; emits same state layout as PandasMarketStepIterator.
+    Downsampled windows are aggregated from ring buffer window on every step.
+
+    Incoming rows are either mappings keyed by column names (dicts, pandas Series)
+    or sequences of values ordered as `source_columns`.
+    With `lookahead` enabled one row is prefetched to set `ready` flag to False exactly at the last row;
+    disable it for live feeds to emit state as soon as row arrives.
+    Csv file sources are followed as they grow unless `follow` is False;
+    stream ends when no row arrives within `timeout` seconds (None - never).
+    """
+    def __init__(
+            self,
+            state_config,
+            transport='pandas',
+            source_columns=None,
+            lookahead=True,
+            timeout=None,
+            follow=True,
+            dtype=np.float64,
+            delta_keys=None,
+            delta_dtype=None,
+            name='StreamingMarketStepIterator',
+            task=0,
+            log=None,
+            log_level=INFO,
+    ):
+        super().__init__(
+            state_config=state_config,
+            transport=transport,
+            delta_keys=delta_keys,
+            delta_dtype=delta_dtype,
+            name=name,
+            task=task,
+            log=log,
+            log_level=log_level
+        )
+        self.source_columns = None if source_columns is None else list(source_columns)
+        self.lookahead = lookahead
+        self.timeout = timeout
+        self.follow = follow
+        self.dtype = dtype
+
+        self.columns = self.get_columns(self.state_config)
+        if self.source_columns is not None:
+            self.source_positions = np.asarray([self.source_columns.index(column) for column in self.columns])
+
+        else:
+            self.source_positions = None
+
+        self.buffers = {}
+        self.make_buffers(self.state_config)
+
+        self.rows = None
+        self.next_row = None
+        self.iter_passed = 0
+
+    def get_columns(self, state_config, columns=None):
+        """
+        Returns ordered union of columns over all state leaves.
+        """
+        if columns is None:
+            columns = []
+
+        if isinstance(state_config, dict):
+            for value in state_config.values():
+                self.get_columns(value, columns)
+
+        else:
+            columns += [column for column in state_config.columns if column not in columns]
+
+        return columns
+
+    def make_buffers(self, state_config):
+        if isinstance(state_config, dict):
+            for value in state_config.values():
+                self.make_buffers(value)
+
+        else:
+            key = (tuple(state_config.columns), state_config.depth * state_config.stride)
+            if key not in self.buffers:
+                positions = np.asarray([self.columns.index(column) for column in state_config.columns])
+                self.buffers[key] = (
+                    positions,
+                    RingBuffer(key[-1], len(state_config.columns), dtype=self.dtype)
+                )
+
+    def get_row(self, row):
+        if hasattr(row, 'keys'):
+            return np.asarray([row[column] for column in self.columns], dtype=self.dtype)
+
+        else:
+            try:
+                assert self.source_positions is not None
+
+            except AssertionError:
+                e = 'Expected `source_columns` be set to map sequence rows to columns, got None'
+                self.log.error(e)
+                raise ValueError(e)
+
+            return np.asarray(row, dtype=self.dtype)[self.source_positions]
+
+    def fetch(self):
+        """
+        Returns next row as vector of values ordered as `columns` or None if source is exhausted.
+        """
+        try:
+            return self.get_row(next(self.rows))
+
+        except StopIteration:
+            return None
+
+    def push(self, row):
+        for positions, buffer in self.buffers.values():
+            buffer.push(row[positions])
+
+    def get_state(self, position, state_config):
+        if isinstance(state_config, dict):
+            state = {key: self.get_state(position, value) for key, value in state_config.items()}
+
+        else:
+            length = state_config.depth * state_config.stride
+            buffer = self.buffers[(tuple(state_config.columns), length)][-1]
+            index = np.arange(position - length, position)
+            if is_multiscale(state_config):
+                values = aggregate_window(buffer.window(), state_config.stride, state_config.aggregation)
+                index = index[state_config.stride - 1::state_config.stride]
+
+            else:
+                values = buffer.window().copy()
+
+            if self.transport == 'numpy':
+                state = ArrayFrame(values, state_columns(state_config), index)
+
+            else:
+                state = DataFrame(values, columns=state_columns(state_config), index=index)
+
+        return state
+
+    def _start(self, source):
+        self.rows = iterate_rows(source, timeout=self.timeout, follow=self.follow)
+        self.log.debug('got data source of type: {}'.format(type(source)))
+        for _, buffer in self.buffers.values():
+            buffer.reset()
+
+        # Warm up: fill all buffers but one row, next one is pushed on first update:
+        for i in range(self.sample_max_depth - 1):
+            row = self.fetch()
+            if row is None:
+                e = 'Data source exhausted while filling initial window: got {} rows, expected at least {}'.format(
+                    i, self.sample_max_depth
+                )
+                self.log.error(e)
+                raise ValueError(e)
+
+            self.push(row)
+
+        if self.lookahead:
+            self.next_row = self.fetch()
+
+            if self.next_row is None:
+                e = 'Data source exhausted while filling initial window, expected at least {} rows'.format(
+                    self.sample_max_depth
+                )
+                self.log.error(e)
+                raise ValueError(e)
+
+        self.start_pointer = self.sample_max_depth
+        self.iter_passed = 0
+        self.ready = True
+
+    def _update_state(self):
+        if self.ready:
+            if self.lookahead:
+                row = self.next_row
+                self.next_row = self.fetch()
+                self.ready = self.next_row is not None
+
+            else:
+                row = self.fetch()
+                self.ready = row is not None
+
+            if row is not None:
+                self.push(row)
+                self.iter_passed += 1
+
+            self.state = self.get_state(self.start_pointer + self.iter_passed - 1, self.state_config)
+
+            self.log.debug('market iteration {}, ready: {}'.format(self.iter_passed, self.ready))
+            self.state = self.encode_deltas(self.state)
+            self.state['ready'] = self.ready
+            return self.state
+
+        else:
+            msg = 'Attempt to iterate exhausted data source.\nHint: forgot to check .ready flag?'
+            self.log.error(msg)
+            raise IndexError(msg)
+
+
+class AsOfMergeStepIterator(StreamingMarketStepIterator):
+    """
+    Iterates over events of several timestamped market data sources (e.g. trades, quotes, bars, signals)
+    merged in time order, emitting as-of aligned state on every event of any source.
+    Sources are merged on the fly by heap-based k-way merge, no aligned frame is ever materialized.
+
+    Expects input state on reset as dictionary of sources keyed by name, each either DataFrame,
+    (timestamps, values) tuple or stream of (timestamp, row) pairs, see `stream.merge_asof`.
+    State config columns refer merged values as `source/column`. Emitted state also holds
+    `timestamp` and `source` name of the last event.
+    """
+    def __init__(
+            self,
+            state_config,
+            source_columns,
+            transport='pandas',
+            time_columns=None,
+            wait_all=True,
+            lookahead=True,
+            timeout=None,
+            dtype=np.float64,
+            delta_keys=None,
+            delta_dtype=None,
+            name='AsOfMergeStepIterator',
+            task=0,
+            log=None,
+            log_level=INFO,
+    ):
+        """
+
+        Args:
+            state_config:   nested dictionary of PandasStateConfig instances over `source/column` names
+            source_columns: dictionary of columns lists keyed by source name
+            time_columns:   dictionary of DataFrame sources time columns, if not index
+            wait_all:       if True, events are skipped until every source got its first value
+        """
+        self.merge_columns = copy.deepcopy(source_columns)
+        self.time_columns = time_columns
+        self.wait_all = wait_all
+        self.event = None
+        self.next_event = None
+        super().__init__(
+            state_config=state_config,
+            transport=transport,
+            source_columns=merged_columns(self.merge_columns),
+            lookahead=lookahead,
+            timeout=timeout,
+            dtype=dtype,
+            delta_keys=delta_keys,
+            delta_dtype=delta_dtype,
+            name=name,
+            task=task,
+            log=log,
+            log_level=log_level
+        )
+
+    def fetch(self):
+        self.event, self.next_event = self.next_event, next(self.rows, None)
+        if self.next_event is None:
+            return None
+
+        return self.get_row(self.next_event[-1])
+
+    def _start(self, sources):
+        try:
+            assert isinstance(sources, dict) and set(sources.keys()) == set(self.merge_columns.keys())
+
+        except AssertionError:
+            e = 'Expected input state be dictionary of sources keyed by {}, got: {}'.format(
+                list(self.merge_columns.keys()), type(sources)
+            )
+            self.log.error(e)
+            raise ValueError(e)
+
+        super()._start(
+            merge_asof(
+                sources,
+                self.merge_columns,
+                time_columns=self.time_columns,
+                wait_all=self.wait_all,
+                timeout=self.timeout,
+            )
+        )
+
+    def _update_state(self):
+        state = super()._update_state()
+        # Last pushed event is the one before prefetched or before source got exhausted:
+        if self.lookahead or self.next_event is None:
+            timestamp, source, _ = self.event
+
+        else:
+            timestamp, source, _ = self.next_event
+
+        state['timestamp'] = timestamp
+        state['source'] = source
+        return state
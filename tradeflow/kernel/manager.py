@@ -1,11 +1,14 @@
 from logbook import INFO
+import os
 import sys
 import copy
+import uuid
 import numpy as np
-from collections import namedtuple, OrderedDict
+from pandas import DataFrame
+from collections import OrderedDict
 
 from ..core import Kernel
-from .action import MarketOrder
+from .action import MarketOrder, MarketOrderArray, ORDER_TYPES
 
 
 import warnings
@@ -14,11 +17,105 @@ if not sys.warnoptions:
     warnings.simplefilter("ignore")
 
 
-OrderRecord = namedtuple('OrderRecord', ['type', 'size', 'result'])
+TradeLogRecord = np.dtype(
+    [
+        ('step', np.int64),
+        ('asset', np.int32),
+        ('type', np.int8),
+        ('size', np.float64),
+        ('price', np.float64),
+        ('commission', np.float64),
+        ('executed', np.bool_),
+    ]
+)
+
+
+class TradeLog(object):
+    """
+    Episode-level order log backed by preallocated numpy structured array of TradeLogRecord dtype.
+    Assets and order types are stored as integer indices into `assets` and `orders` lists.
+    Capacity grows geometrically when exceeded.
+    """
+    def __init__(self, assets, orders, capacity=1024):
+        self.assets = list(assets)
+        self.orders = list(orders)
+        self.records = np.zeros(max(int(capacity), 1), dtype=TradeLogRecord)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def data(self):
+        """
+        View of records logged so far.
+        """
+        return self.records[:self.size]
+
+    def clear(self):
+        self.size = 0
+
+    def reserve(self, num_records):
+        capacity = self.records.shape[0]
+        if self.size + num_records > capacity:
+            while self.size + num_records > capacity:
+                capacity *= 2
+
+            records = np.zeros(capacity, dtype=TradeLogRecord)
+            records[:self.size] = self.records[:self.size]
+            self.records = records
+
+    def append(self, step, asset, type, size, price, commission, executed):
+        self.reserve(1)
+        self.records[self.size] = (step, asset, type, size, price, commission, executed)
+        self.size += 1
+
+    def extend(self, step, asset, type, size, price, commission, executed):
+        """
+        Appends records given as equal-length arrays (scalars are broadcast).
+        """
+        num_records = np.asarray(asset).shape[0]
+        self.reserve(num_records)
+        records = self.records[self.size: self.size + num_records]
+        records['step'] = step
+        records['asset'] = asset
+        records['type'] = type
+        records['size'] = size
+        records['price'] = price
+        records['commission'] = commission
+        records['executed'] = executed
+        self.size += num_records
+
+    def to_frame(self):
+        """
+        Returns records as pandas DataFrame with asset names and order types resolved.
+        """
+        frame = DataFrame(self.data)
+        frame['asset'] = np.asarray(self.assets, dtype=object)[frame['asset'].values]
+        frame['type'] = np.asarray(self.orders, dtype=object)[frame['type'].values]
+        return frame
+
+    def save(self, path):
+        """
+        Exports records in bulk: to Parquet if `path` ends with `.parquet`, to numpy `.npy` file otherwise.
+        """
+        if path.endswith('.parquet'):
+            self.to_frame().to_parquet(path)
+
+        else:
+            np.save(path, self.data)
+
+        return path
 
 
 class BasePortfolioManager(Kernel):
+    """
+    Executes market orders, tracks portfolio value and logs orders to episode trade log.
 
+    Orders come either as list of MarketOrder tuples or as MarketOrderArray, latter executed in single
+    vectorized pass (at most one order per asset). If `prices_key` is set, prices of all assets are read
+    from that market state entry, holding one column per asset, rather than from per-asset entries.
+    """
     def __init__(
             self,
             max_position_size,
@@ -26,6 +123,10 @@ class BasePortfolioManager(Kernel):
             order_commission=0.0,
             orders=('buy', 'sell', 'close'),
             assets=('default_asset',),
+            trade_log_capacity=1024,
+            trade_log_dir=None,
+            trade_log_format='npy',
+            prices_key=None,
             name='PortfolioManager',
             pass_input_state=False,
             task=0,
@@ -40,6 +141,19 @@ class BasePortfolioManager(Kernel):
         self.orders = orders
         self.assets = list(assets)
         self.pass_input_state = pass_input_state
+        self.prices_key = prices_key
+
+        self.asset_index = {asset: i for i, asset in enumerate(self.assets)}
+        self.order_index = {order: i for i, order in enumerate(self.orders)}
+        # Maps MarketOrderArray types to `orders` indices, -1 - not supported:
+        self.order_type_index = np.asarray([self.order_index.get(order, -1) for order in ORDER_TYPES], dtype=np.int8)
+        self.trade_log = TradeLog(self.assets, self.orders, capacity=trade_log_capacity)
+        self.trade_log_dir = trade_log_dir
+        self.trade_log_format = trade_log_format
+        # Tells apart trade logs of parallel environments sharing name and task:
+        self.run_id = uuid.uuid4().hex[:8]
+        self.episode = 0
+        self.step = 0
 
         self.portfolio = None
         self.portfolio_value = None
@@ -52,13 +166,44 @@ class BasePortfolioManager(Kernel):
         self.last_portfolio_value = None
         self.last_realised_portfolio_value = None
 
-        self.step_order_record = None
+    def get_assets_prices(self, market_state):
+        # Prices are read from the last (current) row of market state entries:
+        if self.prices_key is not None:
+            return np.concatenate([np.ones(1), market_state[self.prices_key][self.assets].values[-1, :]])
+
+        return np.concatenate([np.ones(1)] + [market_state[asset].values[-1, :] for asset in self.assets])
 
-    def update_portfolio_value(self, market_state):
-        self.assets_prices = np.concatenate([np.ones(1)] + [market_state[asset].values[0, :] for asset in self.assets])
+    def num_pending_orders(self):
+        if isinstance(self.submitted_orders, MarketOrderArray):
+            return self.submitted_orders.asset.shape[0]
+
+        return len(self.submitted_orders)
+
+    def update_portfolio_value(self, market_state, assets_prices=None):
+        if assets_prices is None:
+            assets_prices = self.get_assets_prices(market_state)
+
+        self.assets_prices = assets_prices
         self.portfolio_value = np.sum(np.asarray(list(self.portfolio.values())) * self.assets_prices)
 
     def submit_orders(self, orders):
+        if isinstance(orders, MarketOrderArray):
+            try:
+                assert orders.asset.shape[0] == 0 or (
+                    orders.asset.min() >= 0 and orders.asset.max() < len(self.assets) and
+                    (self.order_type_index[orders.type] >= 0).all()
+                )
+
+            except AssertionError:
+                msg = 'Expected order assets indices be in [0, {}) and types in {}, got: {}'.format(
+                    len(self.assets), self.orders, orders
+                )
+                self.log.error(msg)
+                raise ValueError(msg)
+
+            self.submitted_orders = orders
+            return
+
         if not isinstance(orders, list):
             orders_list = [orders]
 
@@ -85,7 +230,17 @@ class BasePortfolioManager(Kernel):
         self.submitted_orders = orders_list
 
     def execute_orders(self, market_state):
-        self.step_order_record = []
+        """
+        Executes pending orders, logs every order to episode trade log.
+
+        Returns:
+            structured array of TradeLogRecord dtype holding this step orders
+        """
+        if isinstance(self.submitted_orders, MarketOrderArray):
+            return self.execute_order_array(market_state)
+
+        step_start = len(self.trade_log)
+        prices = self.get_assets_prices(market_state)
         while len(self.submitted_orders) > 0:
             order = self.submitted_orders.pop(-1)
 
@@ -104,7 +259,8 @@ class BasePortfolioManager(Kernel):
                 raise ValueError(msg)
             self.log.debug('order type: {}'.format(order.type))
 
-            order_value = abs(np.squeeze(market_state[order.asset].values * order_size))
+            price = prices[self.asset_index[order.asset] + 1]
+            order_value = abs(price * order_size)
             friction_value = order_value * self.order_commission
 
             self.log.debug('order_value: {:.4f}, friction_value: {:.6f}'.format(order_value, friction_value))
@@ -122,8 +278,7 @@ class BasePortfolioManager(Kernel):
 
                 self.portfolio[order.asset] += order_size
 
-                cash_flow = (previous_asset_size - self.portfolio[order.asset]) \
-                    * np.squeeze(market_state[order.asset].values)
+                cash_flow = (previous_asset_size - self.portfolio[order.asset]) * price
 
                 self.log.debug('cash_flow: {:.4f}'.format(cash_flow))
 
@@ -134,14 +289,100 @@ class BasePortfolioManager(Kernel):
 
                 self.log.debug('asset_just_closed: {}'.format(self.asset_just_closed))
 
-            self.step_order_record.append(
-                OrderRecord(
-                    type=order.type,
-                    size=order_size,
-                    result=order_executed,
+            self.trade_log.append(
+                step=self.step,
+                asset=self.asset_index[order.asset],
+                type=self.order_index[order.type],
+                size=order_size,
+                price=price,
+                commission=friction_value if order_executed else 0.0,
+                executed=order_executed,
+            )
+
+        return self.trade_log.data[step_start:].copy()
+
+    def execute_order_array(self, market_state):
+        """
+        Executes pending MarketOrderArray in single vectorized pass, logs orders to episode trade log.
+
+        Returns:
+            structured array of TradeLogRecord dtype holding this step orders
+        """
+        orders, self.submitted_orders = self.submitted_orders, []
+        assets = orders.asset
+        step_start = len(self.trade_log)
+        if assets.shape[0] == 0:
+            return self.trade_log.data[:0].copy()
+
+        prices = self.get_assets_prices(market_state)[1:][assets]
+        positions = np.fromiter(self.portfolio.values(), dtype=np.float64, count=len(self.portfolio))[1:]
+        previous_sizes = positions[assets]
+
+        order_sizes = np.where(
+            orders.type == 0,
+            self.order_size,
+            np.where(orders.type == 1, - self.order_size, - previous_sizes)
+        )
+        executed = (np.abs(previous_sizes + order_sizes) <= self.max_position_size) & (order_sizes != 0)
+        friction_values = np.abs(prices * order_sizes) * self.order_commission
+        new_sizes = previous_sizes + np.where(executed, order_sizes, 0.0)
+
+        self.portfolio['cash'] += np.sum(
+            np.where(executed, (previous_sizes - new_sizes) * prices - friction_values, 0.0)
+        )
+        # Only touched assets are written back:
+        for i in np.flatnonzero(executed):
+            asset = self.assets[assets[i]]
+            self.portfolio[asset] = new_sizes[i]
+            if new_sizes[i] == 0:
+                self.asset_just_closed[asset] = True
+
+        self.trade_log.extend(
+            step=self.step,
+            asset=assets,
+            type=self.order_type_index[orders.type],
+            size=order_sizes,
+            price=prices,
+            commission=np.where(executed, friction_values, 0.0),
+            executed=executed,
+        )
+        return self.trade_log.data[step_start:].copy()
+
+    def export_trade_log(self, path=None):
+        """
+        Saves current episode trade log to `path` or, if not given, to `trade_log_dir`.
+        """
+        if path is None:
+            path = os.path.join(
+                self.trade_log_dir,
+                '{}_{}_{}_episode_{}.{}'.format(
+                    self.name.replace('/', '_'),
+                    self.task,
+                    self.run_id,
+                    self.episode,
+                    self.trade_log_format
                 )
             )
 
+        self.log.debug('saving {} trade log records to: {}'.format(len(self.trade_log), path))
+        return self.trade_log.save(path)
+
+    def flush_trade_log(self):
+        """
+        Exports current episode trade log, if any, to `trade_log_dir` and starts new episode log.
+        """
+        if self.trade_log_dir is not None and len(self.trade_log) > 0:
+            self.export_trade_log()
+            self.episode += 1
+
+        self.trade_log.clear()
+
+    def close(self):
+        """
+        Saves last episode trade log which otherwise is only exported on next reset.
+        """
+        self.flush_trade_log()
+
     def reset_just_closed(self):
         # self.log.debug('self.asset_just_closed: ', self.asset_just_closed)
         for k in self.asset_just_closed.keys():
@@ -161,6 +402,8 @@ class BasePortfolioManager(Kernel):
             return self.state
 
     def _start(self, market_state):
+        self.flush_trade_log()
+        self.step = 0
         self.portfolio = OrderedDict(
             [
                 (name, amount) for name, amount in zip(['cash'] + self.assets, np.zeros(len(self.assets) + 1))
@@ -183,12 +426,28 @@ class BasePortfolioManager(Kernel):
 
     def _update_state(self, market_state, orders):
 
-        # Execute pending orders:
         self.reset_just_closed()
-        self.execute_orders(market_state)
+        assets_prices = self.get_assets_prices(market_state)
+
+        if self.step > 0 and self.num_pending_orders() == 0 and np.array_equal(assets_prices, self.assets_prices):
+            # Nothing to execute and prices unchanged, short-circuit: portfolio stays the same.
+            self.unrealised_return = 0.0
+            self.realised_return = np.nan
+            self.state = dict(
+                self.state,
+                realized_return=self.realised_return,
+                unrealized_return=self.unrealised_return,
+                order=self.trade_log.data[:0].copy(),
+            )
+            self.step += 1
+            self.submit_orders(orders)
+            return
+
+        # Execute pending orders:
+        step_orders = self.execute_orders(market_state)
 
         # Compute state:
-        self.update_portfolio_value(market_state)
+        self.update_portfolio_value(market_state, assets_prices)
 
         self.unrealised_return = self.portfolio_value - self.last_portfolio_value
         self.last_portfolio_value = copy.copy(self.portfolio_value)
@@ -209,7 +468,8 @@ class BasePortfolioManager(Kernel):
             broker_value=self.portfolio_value,  # btgym compatibility
             realized_return=self.realised_return,
             unrealized_return=self.unrealised_return,
-            order=self.step_order_record,
+            order=step_orders,
         )
+        self.step += 1
 
         self.submit_orders(orders)
\ No newline at end of file
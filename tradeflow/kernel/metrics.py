@@ -0,0 +1,131 @@
+from logbook import INFO
+import numpy as np
+from collections import OrderedDict
+
+from ..core import Kernel
+
+
+class OnlineEpisodeMetrics(Kernel):
+    """
+    Tracks episode performance statistics online with O(1) memory:
+    per-step portfolio returns mean and variance (Welford updates) and Sharpe ratio,
+    maximum drawdown (running peak tracking), closed trades hit rate, turnover and trade count.
+    Emits summary dictionary when episode is done, None otherwise.
+    """
+    def __init__(
+            self,
+            annualization=1.0,
+            name='OnlineEpisodeMetrics',
+            task=0,
+            log=None,
+            log_level=INFO,
+    ):
+        """
+
+        Args:
+            annualization:  number of steps per year (or any other period) Sharpe ratio is scaled to;
+                            1.0 gives per-step ratio
+        """
+        super().__init__(name=name, task=task, log=log, log_level=log_level)
+        self.annualization = annualization
+
+        self.steps = 0
+        self.mean_return = 0.0
+        self.m2_return = 0.0
+        self.last_value = 0.0
+        self.peak_value = 0.0
+        self.max_drawdown = 0.0
+        self.closed_trades = 0
+        self.winning_trades = 0
+        self.turnover = 0.0
+        self.trade_count = 0
+
+    def update_state(self, input_state, reset, done):
+        if reset:
+            self._start(input_state)
+
+        else:
+            self._update_state(input_state)
+
+        if done:
+            self.state = self.summary()
+
+        else:
+            self.state = None
+
+        return self.state
+
+    def _start(self, portfolio_state):
+        self.steps = 0
+        self.mean_return = 0.0
+        self.m2_return = 0.0
+        self.last_value = portfolio_state['portfolio_value']
+        self.peak_value = self.last_value
+        self.max_drawdown = 0.0
+        self.closed_trades = 0
+        self.winning_trades = 0
+        self.turnover = 0.0
+        self.trade_count = 0
+        self.ready = True
+
+    def _update_state(self, portfolio_state):
+        try:
+            value = portfolio_state['portfolio_value']
+            realized_return = portfolio_state['realized_return']
+            orders = portfolio_state['order']
+
+        except KeyError:
+            e = 'Expected keys `portfolio_value`, `realized_return` and `order` not found in portfolio state'
+            self.log.error(e)
+            raise ValueError(e)
+
+        # Welford update of step returns moments:
+        step_return = value - self.last_value
+        self.last_value = value
+        self.steps += 1
+        delta = step_return - self.mean_return
+        self.mean_return += delta / self.steps
+        self.m2_return += delta * (step_return - self.mean_return)
+
+        self.peak_value = max(self.peak_value, value)
+        self.max_drawdown = max(self.max_drawdown, self.peak_value - value)
+
+        if not np.isnan(realized_return):
+            self.closed_trades += 1
+            self.winning_trades += int(realized_return > 0)
+
+        executed = orders['executed']
+        self.trade_count += int(executed.sum())
+        self.turnover += np.abs(orders['size'][executed]).sum()
+
+    def summary(self):
+        if self.steps > 1:
+            std_return = np.sqrt(self.m2_return / (self.steps - 1))
+
+        else:
+            std_return = 0.0
+
+        if std_return > 0:
+            sharpe_ratio = self.mean_return / std_return * np.sqrt(self.annualization)
+
+        else:
+            sharpe_ratio = 0.0
+
+        if self.closed_trades > 0:
+            hit_rate = self.winning_trades / self.closed_trades
+
+        else:
+            hit_rate = np.nan
+
+        return OrderedDict(
+            steps=self.steps,
+            total_return=self.mean_return * self.steps,
+            mean_return=self.mean_return,
+            std_return=std_return,
+            sharpe_ratio=sharpe_ratio,
+            max_drawdown=self.max_drawdown,
+            closed_trades=self.closed_trades,
+            hit_rate=hit_rate,
+            turnover=self.turnover,
+            trade_count=self.trade_count,
+        )
@@ -0,0 +1,340 @@
+from logbook import INFO
+import os
+import numpy as np
+from collections import OrderedDict
+
+from ..core import Kernel
+
+try:
+    import fcntl
+
+except ImportError:
+    # No inter-process locking available, single writer only:
+    fcntl = None
+
+
+def flatten_shapes(space_config, prefix=''):
+    """
+    Flattens nested dictionary of shapes (as StateToDictSpace `space_config`) to ordered dictionary
+    keyed by dot-separated key paths.
+    """
+    if isinstance(space_config, dict):
+        shapes = OrderedDict()
+        for key in sorted(space_config.keys()):
+            shapes.update(flatten_shapes(space_config[key], prefix + str(key) + '.'))
+
+        return shapes
+
+    else:
+        return OrderedDict([(prefix[:-1], tuple(space_config))])
+
+
+def flatten_state(state, shapes):
+    """
+    Picks values of nested dictionary state for every flattened key.
+    """
+    values = []
+    for key in shapes.keys():
+        value = state
+        for name in key.split('.'):
+            value = value[name]
+
+        values.append(value)
+
+    return values
+
+
+def unflatten_state(values):
+    """
+    Converts dictionary keyed by dot-separated key paths back to nested dictionary.
+    """
+    state = {}
+    for key, value in values.items():
+        level = state
+        names = key.split('.')
+        for name in names[:-1]:
+            level = level.setdefault(name, {})
+
+        level[names[-1]] = value
+
+    return state
+
+
+class MemmapReplayBuffer(object):
+    """
+    Fixed-capacity circular buffer of (observation, action, reward, done, next_observation) transitions
+    stored as float32 memory-mapped arrays in `path` directory, one file per observation component.
+
+    Several processes can open same directory and write concurrently: write slots are reserved
+    under exclusive file lock, arrays are written outside of it under per-slot lock (writers lagging
+    by entire capacity could get same slot). Every slot keeps sequence number
+    of transition it holds, reset to zero while slot is being written and set after, so readers never
+    get transitions being written: rows whose sequence is zero or changed during read are sampled anew.
+    Random batches are read with single vectorized fancy indexing per array.
+    """
+    def __init__(self, path, capacity, space_config, action_shape=(), action_dtype=np.int64):
+        """
+
+        Args:
+            path:           directory to keep buffer files in; created if not exists,
+                            existing buffer of same layout is opened for appending otherwise
+            capacity:       maximum number of transitions kept
+            space_config:   (nested dictionary of) observation shapes, as StateToDictSpace space_config
+            action_shape:   shape of single action
+            action_dtype:   action dtype
+        """
+        self.path = path
+        self.capacity = int(capacity)
+        self.shapes = flatten_shapes(space_config)
+        self.action_shape = tuple(action_shape)
+        self.action_dtype = action_dtype
+
+        os.makedirs(self.path, exist_ok=True)
+        self.lock_file = open(os.path.join(self.path, 'lock'), 'a')
+
+        # Header is written last, so other writers either create entire buffer or open complete one:
+        self._lock()
+        try:
+            header_path = os.path.join(self.path, 'header.dat')
+            mode = 'r+' if os.path.exists(header_path) else 'w+'
+
+            self.observations = OrderedDict()
+            self.next_observations = OrderedDict()
+            for key, shape in self.shapes.items():
+                self.observations[key] = self._open('observation.{}'.format(key), np.float32, shape, mode)
+                self.next_observations[key] = self._open('next_observation.{}'.format(key), np.float32, shape, mode)
+
+            self.actions = self._open('action', self.action_dtype, self.action_shape, mode)
+            self.rewards = self._open('reward', np.float32, (), mode)
+            self.dones = self._open('done', np.bool_, (), mode)
+            # Sequence number (1-based) of transition slot holds, 0 - empty or being written:
+            self.sequences = self._open('sequence', np.int64, (), mode)
+
+            # Total numbers of transitions ever reserved and committed:
+            self.header = np.memmap(header_path, dtype=np.int64, mode=mode, shape=(2,))
+
+        finally:
+            self._unlock()
+
+    def _lock(self):
+        if fcntl is not None:
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+
+    def _unlock(self):
+        if fcntl is not None:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+
+    def _lock_slot(self, slot):
+        # Byte-range locks are independent of whole file `flock` ones:
+        if fcntl is not None:
+            fcntl.lockf(self.lock_file, fcntl.LOCK_EX, 1, int(slot))
+
+    def _unlock_slot(self, slot):
+        if fcntl is not None:
+            fcntl.lockf(self.lock_file, fcntl.LOCK_UN, 1, int(slot))
+
+    def _open(self, name, dtype, shape, mode):
+        return np.memmap(
+            os.path.join(self.path, name + '.dat'),
+            dtype=dtype,
+            mode=mode,
+            shape=(self.capacity,) + tuple(shape),
+        )
+
+    def __len__(self):
+        return int(min(self.header[1], self.capacity))
+
+    @property
+    def count(self):
+        """
+        Total number of transitions ever written.
+        """
+        return int(self.header[1])
+
+    def reserve(self, num_transitions=1):
+        """
+        Atomically reserves `num_transitions` consecutive write slots.
+
+        Returns:
+            array of transitions sequence numbers (1-based), slot indices are these minus one modulo capacity
+        """
+        self._lock()
+        try:
+            start = int(self.header[0])
+            self.header[0] = start + num_transitions
+
+        finally:
+            self._unlock()
+
+        return np.arange(start + 1, start + num_transitions + 1)
+
+    def commit(self, num_transitions=1):
+        self._lock()
+        try:
+            self.header[1] += num_transitions
+
+        finally:
+            self._unlock()
+
+    def add(self, observation, action, reward, done, next_observation):
+        """
+        Writes single transition; observations are nested dictionaries of arrays shaped as `space_config`.
+        """
+        sequence = self.reserve(1)[0]
+        slot = (sequence - 1) % self.capacity
+
+        self._lock_slot(slot)
+        try:
+            # Invalidate slot for readers while it is being written:
+            self.sequences[slot] = 0
+            for array, value in zip(self.observations.values(), flatten_state(observation, self.shapes)):
+                array[slot] = value
+
+            for array, value in zip(self.next_observations.values(), flatten_state(next_observation, self.shapes)):
+                array[slot] = value
+
+            self.actions[slot] = action
+            self.rewards[slot] = reward
+            self.dones[slot] = done
+            self.sequences[slot] = sequence
+
+        finally:
+            self._unlock_slot(slot)
+
+        self.commit(1)
+        return slot
+
+    def _read(self, indices):
+        values = OrderedDict()
+        for key, array in self.observations.items():
+            values['observation.' + key] = np.asarray(array[indices])
+
+        for key, array in self.next_observations.items():
+            values['next_observation.' + key] = np.asarray(array[indices])
+
+        values['action'] = np.asarray(self.actions[indices])
+        values['reward'] = np.asarray(self.rewards[indices])
+        values['done'] = np.asarray(self.dones[indices])
+        return values
+
+    def sample(self, batch_size, rng=None, max_attempts=100):
+        """
+        Reads random batch of committed transitions.
+
+        Args:
+            batch_size:     number of transitions
+            rng:            numpy random state, None - global one
+            max_attempts:   maximum number of reads to replace rows being written concurrently
+
+        Returns:
+            dictionary of `observation`, `action`, `reward`, `done`, `next_observation` batches;
+            observations are nested dictionaries of arrays
+        """
+        if rng is None:
+            rng = np.random
+
+        try:
+            assert len(self) > 0
+
+        except AssertionError:
+            raise ValueError('Attempt to sample from empty replay buffer')
+
+        # Reserved slots could get committed out of order, draw from all of them, reject uncommitted:
+        high = int(min(self.header[0], self.capacity))
+        batch = None
+        positions = np.arange(batch_size)
+        for _ in range(max_attempts):
+            indices = np.sort(rng.randint(0, high, size=positions.shape[0]))
+            before = np.asarray(self.sequences[indices])
+            values = self._read(indices)
+            valid = (before > 0) & (before == np.asarray(self.sequences[indices]))
+
+            if batch is None:
+                batch = values
+
+            else:
+                for key, value in values.items():
+                    batch[key][positions[valid]] = value[valid]
+
+            positions = positions[~valid]
+            if positions.shape[0] == 0:
+                break
+
+        else:
+            raise RuntimeError(
+                'Failed to read {} of {} transitions in {} attempts'.format(
+                    positions.shape[0], batch_size, max_attempts
+                )
+            )
+
+        state = unflatten_state(batch)
+        return dict(
+            observation=state['observation'],
+            action=state['action'],
+            reward=state['reward'],
+            done=state['done'],
+            next_observation=state['next_observation'],
+        )
+
+    def flush(self):
+        for array in list(self.observations.values()) + list(self.next_observations.values()):
+            array.flush()
+
+        for array in (self.actions, self.rewards, self.dones, self.sequences, self.header):
+            array.flush()
+
+    def close(self):
+        """
+        Flushes arrays and releases lock file.
+        """
+        self.flush()
+        self.lock_file.close()
+
+
+class MemmapTransitionRecorder(Kernel):
+    """
+    Records environment transitions to memory-mapped replay buffer.
+    Expects observation as emitted by StateToDictSpace, incoming action, reward and done flag;
+    emits total number of transitions written to the buffer.
+    """
+    def __init__(
+            self,
+            path,
+            capacity,
+            space_config,
+            action_shape=(),
+            action_dtype=np.int64,
+            name='MemmapTransitionRecorder',
+            task=0,
+            log=None,
+            log_level=INFO,
+    ):
+        super().__init__(name=name, task=task, log=log, log_level=log_level)
+        self.buffer = MemmapReplayBuffer(
+            path=path,
+            capacity=capacity,
+            space_config=space_config,
+            action_shape=action_shape,
+            action_dtype=action_dtype,
+        )
+        self.last_observation = None
+
+    def update_state(self, observation, action, reward, done, reset):
+        if reset:
+            self.last_observation = observation
+
+        else:
+            if isinstance(action, dict):
+                action = np.asarray(list(action.values()))
+
+            self.buffer.add(self.last_observation, action, reward, done, observation)
+            self.last_observation = observation
+
+        self.state = self.buffer.count
+        return self.state
+
+    def close(self):
+        """
+        Flushes replay buffer and releases its lock file.
+        """
+        self.buffer.close()
@@ -8,6 +8,9 @@ class ClosedTradeRewardFn(Kernel):
     """
     Simple single asset reward function.
     """
+    # Reset state is constant:
+    depends_on = {'reset': ()}
+
     def __init__(
             self,
             unrealized_pnl_weight=1.0,
@@ -46,6 +49,11 @@ class ClosedTradeRewardFn(Kernel):
 
         self.log.debug('u_ret: {}, r_ret: {}'.format(u_ret, r_ret))
 
+        if np.all(np.asarray(u_ret) == 0) and np.all(np.isnan(r_ret)):
+            # No value change, no closed trades:
+            self.state = 0.0
+            return
+
         mean_unr_returns = np.mean(np.asarray(u_ret))
         mean_real_returns = np.nanmean(np.asarray(r_ret))
         if np.isnan(mean_real_returns):
@@ -60,3 +68,53 @@ class ClosedTradeRewardFn(Kernel):
             self.clip
         )
 
+    @classmethod
+    def update_state_batch(cls, kernels, inputs):
+        """
+        Vectorized rewards of several kernels, see Kernel.update_state_batch.
+        """
+        states = np.zeros(len(kernels))
+        stepping = [i for i, kernel_inputs in enumerate(inputs) if not kernel_inputs['reset']]
+        if len(stepping) > 0:
+            try:
+                u_ret = [np.asarray(inputs[i]['input_state']['unrealized_return'], dtype=np.float64) for i in stepping]
+                r_ret = [np.asarray(inputs[i]['input_state']['realized_return'], dtype=np.float64) for i in stepping]
+
+            except KeyError:
+                e = 'Expected keys `unrealized_return` and `realized_return` not found in portfolio state'
+                kernels[stepping[0]].log.error(e)
+                raise ValueError(e)
+
+            # Single assets portfolios stack to 2d arrays, anything else falls back to per-kernel means:
+            if len(set(value.size for value in u_ret + r_ret)) == 1:
+                mean_unr_returns = np.stack(u_ret).reshape(len(stepping), -1).mean(axis=-1)
+                r_ret = np.stack(r_ret).reshape(len(stepping), -1)
+                closed = ~np.isnan(r_ret)
+                mean_real_returns = np.where(closed, r_ret, 0.0).sum(axis=-1) / np.maximum(closed.sum(axis=-1), 1)
+
+            else:
+                mean_unr_returns = np.asarray([value.mean() for value in u_ret])
+                mean_real_returns = np.asarray(
+                    [np.nanmean(value) if (~np.isnan(value)).any() else 0.0 for value in r_ret]
+                )
+
+            params = np.asarray(
+                [
+                    [
+                        kernels[i].scale,
+                        kernels[i].unrealized_pnl_weight,
+                        kernels[i].realized_pnl_weight,
+                        kernels[i].clip,
+                    ] for i in stepping
+                ]
+            )
+            states[stepping] = np.clip(
+                params[:, 0] * (mean_unr_returns * params[:, 1] + mean_real_returns * params[:, 2]),
+                -params[:, 3],
+                params[:, 3],
+            )
+
+        for kernel, state in zip(kernels, states):
+            kernel.state = float(state)
+
+        return [kernel.state for kernel in kernels]
@@ -0,0 +1,134 @@
+import numpy as np
+
+
+def build_alias_table(weights):
+    """
+    Builds Walker alias table by Vose's method.
+
+    Args:
+        weights:    1d array of non-negative weights; all zeros are treated as uniform
+
+    Returns:
+        acceptance probabilities array, alias indices array
+    """
+    n = weights.shape[0]
+    total = weights.sum()
+    if total > 0:
+        scaled = weights * (n / total)
+
+    else:
+        scaled = np.ones(n)
+
+    probabilities = np.ones(n)
+    aliases = np.arange(n)
+
+    small = np.flatnonzero(scaled < 1.0).tolist()
+    large = np.flatnonzero(scaled >= 1.0).tolist()
+    scaled = scaled.tolist()
+    while small and large:
+        less = small.pop()
+        more = large[-1]
+        probabilities[less] = scaled[less]
+        aliases[less] = more
+        scaled[more] = scaled[more] + scaled[less] - 1.0
+        if scaled[more] < 1.0:
+            small.append(large.pop())
+
+    # Leftovers are 1.0 up to rounding error and keep default table entries.
+    return probabilities, aliases
+
+
+class AliasSampler(object):
+    """
+    Samples indices proportionally to weights in O(1) per draw.
+
+    Weights are split into blocks of `block_size`, with alias table per block and top level alias table
+    over block sums, so draw is two table lookups and updating weights rebuilds affected blocks
+    and top level table only: O(block_size + number of blocks) rather than O(n).
+    """
+    def __init__(self, weights, block_size=None, rng=None):
+        """
+
+        Args:
+            weights:        1d array of non-negative weights
+            block_size:     number of weights per block, defaults to sqrt of weights number
+            rng:            instance of numpy.random.RandomState; None - new unseeded one
+        """
+        self.weights = np.array(weights, dtype=np.float64).ravel()
+        try:
+            assert self.weights.shape[0] > 0 and (self.weights >= 0).all()
+
+        except AssertionError:
+            raise ValueError('Expected non-empty array of non-negative weights')
+
+        self.size = self.weights.shape[0]
+        self.block_size = int(block_size or max(int(np.sqrt(self.size)), 1))
+        self.num_blocks = -(-self.size // self.block_size)
+        self.rng = rng if rng is not None else np.random.RandomState()
+
+        self.offsets = np.arange(self.num_blocks) * self.block_size
+        self.lengths = np.minimum(self.block_size, self.size - self.offsets)
+        self.probabilities = np.ones(self.size)
+        self.aliases = np.arange(self.size)
+        self.block_sums = np.zeros(self.num_blocks)
+
+        for block in range(self.num_blocks):
+            self._build_block(block)
+
+        self._build_top()
+
+    @property
+    def total(self):
+        return self.block_sums.sum()
+
+    def _build_block(self, block):
+        low = self.offsets[block]
+        high = low + self.lengths[block]
+        probabilities, aliases = build_alias_table(self.weights[low: high])
+        self.probabilities[low: high] = probabilities
+        self.aliases[low: high] = aliases + low
+        self.block_sums[block] = self.weights[low: high].sum()
+
+    def _build_top(self):
+        try:
+            assert self.block_sums.sum() > 0
+
+        except AssertionError:
+            raise ValueError('Expected at least one positive weight')
+
+        self.top_probabilities, self.top_aliases = build_alias_table(self.block_sums)
+
+    def sample(self, size=None):
+        """
+        Draws index or array of `size` indices.
+        """
+        n = 1 if size is None else size
+        uniform = self.rng.random_sample((3, n))
+
+        blocks = (uniform[0] * self.num_blocks).astype(np.int64)
+        blocks = np.where(uniform[1] < self.top_probabilities[blocks], blocks, self.top_aliases[blocks])
+
+        indices = self.offsets[blocks] + (uniform[2] * self.lengths[blocks]).astype(np.int64)
+        # Reuse fractional part of the same uniform for acceptance test:
+        acceptance = uniform[2] * self.lengths[blocks] - (indices - self.offsets[blocks])
+        indices = np.where(acceptance < self.probabilities[indices], indices, self.aliases[indices])
+
+        return int(indices[0]) if size is None else indices
+
+    def update(self, indices, weights):
+        """
+        Sets new weights for given indices (e.g. sampling priorities).
+        """
+        indices = np.asarray(indices, dtype=np.int64).ravel()
+        weights = np.broadcast_to(np.asarray(weights, dtype=np.float64), indices.shape)
+        try:
+            assert (weights >= 0).all()
+
+        except AssertionError:
+            raise ValueError('Expected non-negative weights')
+
+        self.weights[indices] = weights
+        for block in np.unique(indices // self.block_size):
+            self._build_block(block)
+
+        self._build_top()
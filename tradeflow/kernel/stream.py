@@ -0,0 +1,205 @@
+import time
+import queue
+import csv
+import heapq
+
+import numpy as np
+from pandas import DataFrame
+
+
+def iterate_rows(source, timeout=None, sentinel=None, follow=True):
+    """
+    Normalizes incoming market data source to an iterator over rows.
+
+    Args:
+        source:     either path to csv file (tailed as it grows if `follow` is True, see `tail_file`),
+                    instance of queue.Queue (read until `sentinel` is received or `timeout` expires),
+                    pandas DataFrame (iterated row by row) or any iterable/generator of rows
+        timeout:    seconds to wait for next queue item or csv line, None - wait forever
+        sentinel:   queue item marking end of the stream
+        follow:     if False, csv file is read once up to its current end
+
+    Returns:
+        iterator over rows; rows are either mappings keyed by column names or sequences of values
+    """
+    if isinstance(source, str):
+        return tail_file(source, follow=follow, timeout=timeout)
+
+    elif isinstance(source, queue.Queue):
+        return iterate_queue(source, timeout=timeout, sentinel=sentinel)
+
+    elif isinstance(source, DataFrame):
+        return (row for _, row in source.iterrows())
+
+    else:
+        return iter(source)
+
+
+def iterate_queue(source_queue, timeout=None, sentinel=None):
+    """
+    Yields queue items until `sentinel` is received or no item arrives within `timeout` seconds.
+    """
+    while True:
+        try:
+            item = source_queue.get(block=True, timeout=timeout)
+
+        except queue.Empty:
+            return
+
+        if item is sentinel:
+            return
+
+        yield item
+
+
+def tail_file(path, delimiter=',', follow=False, poll_interval=0.1, timeout=None):
+    """
+    Yields rows of csv file with header as dictionaries of floats.
+    If `follow` is True, keeps waiting for new lines appended to the file, like `tail -f` does,
+    until no line arrives within `timeout` seconds (None - wait forever).
+    """
+    with open(path, 'r', newline='') as file:
+        header = next(csv.reader([file.readline()], delimiter=delimiter))
+        pending = ''
+        last_line_time = time.time()
+        while True:
+            line = file.readline()
+            if not line:
+                if follow and (timeout is None or time.time() - last_line_time < timeout):
+                    time.sleep(poll_interval)
+                    continue
+
+                else:
+                    return
+
+            last_line_time = time.time()
+            pending += line
+            if not pending.endswith('\n') and follow:
+                # Partially written line, wait for the rest of it:
+                continue
+
+            values = next(csv.reader([pending], delimiter=delimiter))
+            pending = ''
+            if values:
+                yield dict(zip(header, [float(value) for value in values]))
+
+
+def to_timestamps(values):
+    """
+    Converts datetime-like values (including pandas Timestamps and strings) to int64 nanoseconds,
+    numeric values are kept as is.
+    """
+    values = np.asarray(values)
+    if values.dtype.kind in 'OUS':
+        values = np.asarray(values.tolist(), dtype='datetime64[ns]')
+
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype('datetime64[ns]').view(np.int64)
+
+    return values
+
+
+def iterate_timestamped(source, columns=None, time_column=None, timeout=None, sentinel=None):
+    """
+    Normalizes timestamped market data source to an iterator over (timestamp, values) pairs.
+
+    Args:
+        source:         pandas DataFrame (timestamps taken from `time_column` or index),
+                        tuple of (timestamps array, values 2d array or DataFrame) or
+                        any source accepted by `iterate_rows` yielding (timestamp, row) pairs
+        columns:        columns to take values of; defaults to all DataFrame columns but `time_column`
+        time_column:    DataFrame column holding timestamps, None - use index
+        timeout:        see `iterate_rows`
+        sentinel:       see `iterate_rows`
+
+    Returns:
+        iterator over (timestamp, values vector ordered as `columns`) pairs
+    """
+    if isinstance(source, DataFrame):
+        if columns is None:
+            columns = [column for column in source.columns if column != time_column]
+
+        timestamps = source.index if time_column is None else source[time_column]
+        source = (timestamps, source[list(columns)].values)
+
+    if isinstance(source, tuple):
+        timestamps, values = source
+        if isinstance(values, DataFrame):
+            values = values.values if columns is None else values[list(columns)].values
+
+        return zip(to_timestamps(timestamps).tolist(), np.asarray(values, dtype=np.float64))
+
+    return _normalize_timestamped(iterate_rows(source, timeout=timeout, sentinel=sentinel), columns)
+
+
+def _normalize_timestamped(rows, columns):
+    for timestamp, row in rows:
+        if hasattr(row, 'keys'):
+            yield to_timestamps(timestamp).item(), np.asarray([row[column] for column in columns], dtype=np.float64)
+
+        else:
+            yield to_timestamps(timestamp).item(), np.asarray(row, dtype=np.float64)
+
+
+def merge_asof(sources, columns, time_columns=None, wait_all=True, timeout=None, sentinel=None):
+    """
+    Merges several timestamped sources in time order by heap-based k-way merge and yields
+    as-of aligned values of all sources on every event, holding single pending event per source.
+    Events with equal timestamps are emitted in `sources` order.
+
+    Args:
+        sources:        ordered dictionary of sources keyed by name, see `iterate_timestamped`
+        columns:        dictionary of columns lists keyed by source name; merged columns are named `source/column`
+        time_columns:   dictionary of DataFrame sources time columns, if not index
+        wait_all:       if True, skips events until every source got its first value; missing values are NaN's otherwise
+        timeout:        see `iterate_rows`
+        sentinel:       see `iterate_rows`
+
+    Returns:
+        iterator over (timestamp, source name, merged values vector) tuples
+    """
+    names = list(sources.keys())
+    time_columns = time_columns or {}
+    iterators = [
+        iterate_timestamped(
+            sources[name],
+            columns[name],
+            time_columns.get(name, None),
+            timeout=timeout,
+            sentinel=sentinel
+        ) for name in names
+    ]
+    offsets = np.cumsum([0] + [len(columns[name]) for name in names])
+    values = np.full(offsets[-1], np.nan)
+    seen = np.zeros(len(names), dtype=bool)
+
+    # Heap holds (timestamp, source index, row), source index also breaks ties:
+    heap = []
+    for index, iterator in enumerate(iterators):
+        for timestamp, row in iterator:
+            heap.append((timestamp, index, row))
+            break
+
+    heapq.heapify(heap)
+
+    while len(heap) > 0:
+        timestamp, index, row = heap[0]
+        values[offsets[index]: offsets[index + 1]] = row
+        seen[index] = True
+
+        for next_timestamp, next_row in iterators[index]:
+            heapq.heapreplace(heap, (next_timestamp, index, next_row))
+            break
+
+        else:
+            heapq.heappop(heap)
+
+        if not wait_all or seen.all():
+            yield timestamp, names[index], values.copy()
+
+
+def merged_columns(columns):
+    """
+    Returns names of `merge_asof` values vector entries.
+    """
+    return ['{}/{}'.format(name, column) for name, source_columns in columns.items() for column in source_columns]
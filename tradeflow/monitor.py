@@ -0,0 +1,117 @@
+from logbook import Logger, INFO
+import time
+from collections import OrderedDict
+
+import ray
+
+from .core import KernelDevice, SharedKernelHandle
+
+
+def get_object_store_usage():
+    """
+    Returns Ray object store bytes used and total over all cluster nodes, as reported by raylets;
+    None if Ray is not initialized or memory stats are unavailable (require `ray[default]` installation).
+    """
+    if not ray.is_initialized():
+        return None
+
+    try:
+        from ray._private.internal_api import get_memory_info_reply, get_state_from_address
+        stats = get_memory_info_reply(get_state_from_address()).store_stats
+
+    except Exception:
+        return None
+
+    return dict(used=stats.object_store_bytes_used, total=stats.object_store_bytes_avail)
+
+
+class ResourceMonitor(object):
+    """
+    Samples resource usage of every node kernel process, local or remote:
+    RSS, CPU time and, optionally, largest allocation sites of the kernel code (tracemalloc),
+    plus Ray object store usage when available, see `get_object_store_usage`.
+    Sampling is driven by `poll` calls (e.g. every environment step) and happens at most every `interval` seconds.
+    """
+    def __init__(self, nodes, interval=60.0, tracemalloc_top=0, log_level=INFO, name='ResourceMonitor'):
+        """
+
+        Args:
+            nodes:              dictionary of Node instances keyed by name
+            interval:           minimum seconds between samples
+            tracemalloc_top:    number of largest allocation sites to report per kernel, 0 - disable tracemalloc
+            log_level:          level samples are logged at
+        """
+        self.nodes = nodes
+        self.interval = interval
+        self.tracemalloc_top = tracemalloc_top
+        self.log_level = log_level
+        self.log = Logger(name, level=log_level)
+
+        self.last_sample_time = None
+        self.usage = None
+        self.samples = 0
+
+    def sample(self):
+        """
+        Samples all kernels.
+
+        Returns:
+            ordered dictionary of per node usage dictionaries keyed by node name (see core.get_resource_usage),
+            `object_store` entry, if available, holds used and total Ray object store bytes
+        """
+        usage = OrderedDict()
+        pending = OrderedDict()
+        for name, node in self.nodes.items():
+            if node.kernel_device == KernelDevice.LOCAL:
+                usage[name] = node.kernel.resource_usage(self.tracemalloc_top)
+
+            elif isinstance(node.kernel, SharedKernelHandle):
+                pending[name] = node.kernel.service.resource_usage.remote(self.tracemalloc_top)
+
+            else:
+                pending[name] = node.kernel.resource_usage.remote(self.tracemalloc_top)
+
+        if len(pending) > 0:
+            usage.update(zip(pending.keys(), ray.get(list(pending.values()))))
+
+        object_store = get_object_store_usage()
+        if object_store is not None:
+            usage['object_store'] = object_store
+
+        self.usage = usage
+        self.samples += 1
+        self.last_sample_time = time.time()
+        self.log.log(self.log_level, self.format(usage))
+        return usage
+
+    def poll(self):
+        """
+        Samples kernels if `interval` seconds passed since last sample.
+
+        Returns:
+            usage dictionary if sampled, None otherwise
+        """
+        if self.last_sample_time is None or time.time() - self.last_sample_time >= self.interval:
+            return self.sample()
+
+        return None
+
+    @staticmethod
+    def format(usage):
+        lines = ['resource usage:']
+        for name, value in usage.items():
+            if name == 'object_store':
+                lines.append(
+                    'object store: {:.1f} of {:.1f} MB used'.format(value['used'] / 2**20, value['total'] / 2**20)
+                )
+                continue
+
+            lines.append(
+                '{}: pid {}, rss {:.1f} MB, cpu {:.2f} s'.format(
+                    name, value['pid'], value['rss'] / 2**20, value['cpu_user'] + value['cpu_system']
+                )
+            )
+            for site, size, count in value.get('allocations', []):
+                lines.append('    {}: {:.1f} KB in {} blocks'.format(site, size / 2**10, count))
+
+        return '\n'.join(lines)
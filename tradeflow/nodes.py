@@ -1,9 +1,15 @@
 from .core import Node
 from tradeflow.kernel.base import IdentityKernel, CheckIfDone, StateToDictSpace, StateToBoxSpace, StateToFlatSpace
 from tradeflow.kernel.manager import BasePortfolioManager
-from tradeflow.kernel.action import AssetActionToMarketOrder, DiscreteActionToMarketOrder
+from tradeflow.kernel.action import AssetActionToMarketOrder, DiscreteActionToMarketOrder, ArrayActionToMarketOrder
 from tradeflow.kernel.reward import ClosedTradeRewardFn
+from tradeflow.kernel.feature import IncrementalFeatures
+from tradeflow.kernel.metrics import OnlineEpisodeMetrics
+from tradeflow.kernel.replay import MemmapTransitionRecorder
+from tradeflow.kernel.bars import TickToBars
 from tradeflow.kernel.iterator import PandasMarketEpisodeIterator, PandasMarketStepIterator
+from tradeflow.kernel.iterator import StreamingMarketStepIterator, CatalogEpisodeIterator, AsOfMergeStepIterator
+from tradeflow.kernel.stream import merged_columns
 
 
 class Identity(Node):
@@ -32,6 +38,24 @@ class PandasMarketEpisode(Node):
             **kwargs
         )
 
+    @classmethod
+    def required_columns(cls, config):
+        # Episode start weights column:
+        weights = config.get('weights', None)
+        return [weights] if isinstance(weights, str) else []
+
+
+class CatalogMarketEpisode(Node):
+    """
+    Market episode data provider sampling from DatasetCatalog by instrument, time window and session.
+    """
+    def __init__(self, name='CatalogMarketEpisodeIterator', **kwargs):
+        super().__init__(
+            kernel_class_ref=CatalogEpisodeIterator,
+            name=name,
+            **kwargs
+        )
+
 
 class PandasMarketStep(Node):
     """
@@ -45,6 +69,74 @@ class PandasMarketStep(Node):
         )
 
 
+class StreamingMarketStep(Node):
+    """
+    Step-by-step market data provider consuming rows incrementally from generator, file tail or queue.
+    Memory usage is bounded by state window depth.
+    """
+    def __init__(self, name='StreamingMarketDataIterator', **kwargs):
+        super().__init__(
+            kernel_class_ref=StreamingMarketStepIterator,
+            name=name,
+            **kwargs
+        )
+
+
+class AsOfMergeMarketStep(Node):
+    """
+    Step-by-step market data provider merging several timestamped sources in time order,
+    emits as-of aligned state on every event.
+    """
+    def __init__(self, name='AsOfMergeMarketDataIterator', **kwargs):
+        super().__init__(
+            kernel_class_ref=AsOfMergeStepIterator,
+            name=name,
+            **kwargs
+        )
+
+    @classmethod
+    def required_columns(cls, config):
+        # Merged sources columns and time columns as `source/column`:
+        time_columns = config.get('time_columns', None) or {}
+        return merged_columns(config['source_columns']) + [
+            '{}/{}'.format(name, column) for name, column in time_columns.items()
+        ]
+
+
+class Bars(Node):
+    """
+    Aggregates ticks episode to time, tick or volume bars.
+    """
+    def __init__(self, name='TickToBars', **kwargs):
+        super().__init__(
+            kernel_class_ref=TickToBars,
+            name=name,
+            **kwargs
+        )
+
+    @classmethod
+    def required_columns(cls, config):
+        # Ticks price, volume and time columns, defaults as of TickToBars:
+        columns = [
+            config.get('price_column', 'price'),
+            config.get('volume_column', 'volume'),
+            config.get('time_column'),
+        ]
+        return [column for column in columns if column is not None]
+
+
+class Features(Node):
+    """
+    Computes rolling features (moving averages, z-scores, returns, etc.) incrementally from market state.
+    """
+    def __init__(self, name='IncrementalFeatures', **kwargs):
+        super().__init__(
+            kernel_class_ref=IncrementalFeatures,
+            name=name,
+            **kwargs
+        )
+
+
 class PortfolioManager(Node):
     """
     Basic broker simulator.
@@ -82,6 +174,19 @@ class AssetActionToOrder(Node):
         )
 
 
+class ArrayActionToOrder(Node):
+    """
+    Maps MDP actions from gym.spaces.MultiDiscrete (integer array indexed by asset)
+    to vectorized PortfolioManger orders.
+    """
+    def __init__(self, name='ArrayActionMapper', **kwargs):
+        super().__init__(
+            kernel_class_ref=ArrayActionToMarketOrder,
+            name=name,
+            **kwargs
+        )
+
+
 class TradeReward(Node):
     """
     Basic reward function.
@@ -106,6 +211,30 @@ class Done(Node):
         )
 
 
+class EpisodeMetrics(Node):
+    """
+    Tracks episode performance statistics online, emits summary when episode is done.
+    """
+    def __init__(self, name='EpisodeMetrics', **kwargs):
+        super().__init__(
+            kernel_class_ref=OnlineEpisodeMetrics,
+            name=name,
+            **kwargs
+        )
+
+
+class TransitionRecorder(Node):
+    """
+    Writes (observation, action, reward, done, next observation) transitions to memory-mapped replay buffer.
+    """
+    def __init__(self, name='TransitionRecorder', **kwargs):
+        super().__init__(
+            kernel_class_ref=MemmapTransitionRecorder,
+            name=name,
+            **kwargs
+        )
+
+
 class ToDictSpace(Node):
     """
     Maps state to instance of btgym.spaces.DictSpace
@@ -1,21 +1,23 @@
 from logbook import INFO, DEBUG
 import pythonflow as pf
+import numpy as np
 import pandas as pd
 
 
 from tradeflow import KernelDevice, PandasStateConfig
 from tradeflow.nodes import PandasMarketEpisode, PandasMarketStep, PortfolioManager
-from tradeflow.nodes import ActionToOrder, Done, TradeReward, ToDictSpace
+from tradeflow.nodes import DiscreteActionToOrder, Done, TradeReward, ToDictSpace, EpisodeMetrics
 
 from tradeflow import Environment as Env
-from tradeflow.env.gym import EnvironmentConstructor
+from tradeflow import MultiAgentEnvironment
+from tradeflow.env.gym import EnvironmentConstructor, MultiAgentEnvironmentConstructor
 
 
-df = pd.read_csv('./data/dfk4/insample.csv', float_precision='high', skiprows=0, nrows=None)
+DATA_PATH = './data/dfk4/insample.csv'
 
 
-# Maybe Put dataset to ray object store:
-# df = ray.put(df)
+def load_dataset(path=DATA_PATH):
+    return pd.read_csv(path, float_precision='high', skiprows=0, nrows=None)
 
 
 LOG_LEVEL = INFO
@@ -54,7 +56,7 @@ nodes_config = dict(
         log_level=LOG_LEVEL,
     ),
     order=dict(
-        class_ref=ActionToOrder,
+        class_ref=DiscreteActionToOrder,
         assets=['P_VWAP'],
         device=KernelDevice.LOCAL,
         log_level=LOG_LEVEL
@@ -80,6 +82,11 @@ nodes_config = dict(
         device=KernelDevice.LOCAL,
         log_level=LOG_LEVEL,
     ),
+    metrics=dict(
+        class_ref=EpisodeMetrics,
+        device=KernelDevice.LOCAL,
+        log_level=LOG_LEVEL,
+    ),
     observation=dict(
         class_ref=ToDictSpace,
         space_config = {
@@ -124,6 +131,9 @@ def make_simple_graph(node):
 
         done = node['done'](input_state=market_state)
 
+        # Episode statistics, emitted when episode is over:
+        metrics = node['metrics'](input_state=portfolio_state, reset=is_reset, done=done)
+
         # Filter out all irrelevant fields to get observation tensor(s):
         observation_state = {
             'market_features': market_state['features'],
@@ -145,21 +155,108 @@ def make_simple_graph(node):
         observation=observation_state,
         reward=reward,
         done=done,
+        metrics=metrics,
+    )
+    return graph, graph_input, graph_output
+
+
+def make_multi_agent_graph(node):
+    """
+    Same logic as `make_simple_graph` for several agents:
+    episode, market data and done nodes are shared, every agent gets own orders, portfolio, reward,
+    metrics and observation nodes (lists of nodes in `node` dictionary).
+
+    Args:
+        node:     dictionary of Node instances and lists of per-agent Node instances
+
+    Returns:
+        pf.Graph instance, dictionaries of input of and output handles
+    """
+    with pf.Graph() as graph:
+        is_reset = pf.placeholder(name='reset_input_flag')
+        episode_duration = pf.placeholder(name='episode_duration_input')
+        dataset = pf.placeholder(name='entire_dataset_input')
+        # Sequence of per-agent actions:
+        action = pf.placeholder(name='incoming_mdp_action')
+
+        # Market data is processed once for all agents:
+        episode = node['episode'](input_state=dataset, reset=is_reset, sample_length=episode_duration)
+
+        market_state = node['market'](input_state=episode, reset=is_reset)
+
+        done = node['done'](input_state=market_state)
+
+        rewards, metrics, observations = [], [], []
+        for i in range(len(node['order'])):
+            orders = node['order'][i](input_state=action[i], reset=is_reset)
+
+            portfolio_state = node['manager'][i](input_state=market_state, reset=is_reset, orders=orders)
+
+            reward = node['reward'][i](input_state=portfolio_state, reset=is_reset)
+
+            metrics.append(node['metrics'][i](input_state=portfolio_state, reset=is_reset, done=done))
+
+            observation_state = {
+                'market_features': market_state['features'],
+                'value': portfolio_state['portfolio_value'],
+                'reward': reward,
+            }
+            observations.append(node['observation'][i](input_state=observation_state))
+            rewards.append(reward)
+
+    graph_input = dict(
+        reset=is_reset,
+        dataset=dataset,
+        episode_duration=episode_duration,
+        action=action
+    )
+    graph_output = dict(
+        observation=observations,
+        reward=rewards,
+        done=done,
+        metrics=metrics,
     )
     return graph, graph_input, graph_output
 
 
-# Additional paramters that can be changed in environment runtime:
-env_params = dict(
-    dataset=df,
-    episode_duration=20,
+# Builds environment given runtime parameters;
+# keeps only columns nodes read, stores features at single precision:
+env_constructor = EnvironmentConstructor(
+    Env,
+    nodes_config,
+    build_graph_fn=make_simple_graph,
+    project_columns=True,
+    float_dtype=np.float32,
+)
+
+# Builds environment for several agents trading the same episodes:
+multi_agent_env_constructor = MultiAgentEnvironmentConstructor(
+    MultiAgentEnvironment,
+    nodes_config,
+    num_agents=4,
+    build_graph_fn=make_multi_agent_graph,
+    project_columns=True,
+    float_dtype=np.float32,
 )
 
-# Instantiate envoronment, typically should be done
-# inside remote worker task via ray registration mechanism:
-env = EnvironmentConstructor(Env, nodes_config, build_graph_fn=make_simple_graph)(env_params)
 
-# Now run:
-o = env.reset()
+if __name__ == '__main__':
+    df = load_dataset()
+
+    # Maybe Put dataset to ray object store:
+    # df = ray.put(df)
+
+    # Additional paramters that can be changed in environment runtime:
+    env_params = dict(
+        dataset=df,
+        episode_duration=20,
+    )
+
+    # Instantiate envoronment, typically should be done
+    # inside remote worker task via ray registration mechanism:
+    env = env_constructor(env_params)
+
+    # Now run:
+    o = env.reset()
 
-o, r, d, i = env.step(env.action_space.sample())
+    o, r, d, i = env.step(env.action_space.sample())
@@ -0,0 +1,266 @@
+import os
+import sys
+import time
+import json
+import argparse
+
+import numpy as np
+import pandas as pd
+import psutil
+
+from .env.gym import EnvironmentConstructor
+from .backtest import load_object
+
+
+def make_synthetic_dataset(nodes_config, num_rows=10000, seed=None):
+    """
+    Makes random dataset holding every column nodes read:
+    random walk prices for `assets` columns, standard normal noise for other ones.
+
+    Args:
+        nodes_config:   nodes configuration dict
+        num_rows:       number of rows
+        seed:           random seed
+
+    Returns:
+        pandas DataFrame
+    """
+    rng = np.random.RandomState(seed)
+    columns, price_columns = EnvironmentConstructor.get_required_columns(nodes_config)
+    data = {}
+    for column in columns:
+        if column in price_columns:
+            data[column] = 100.0 * np.exp(np.cumsum(rng.randn(num_rows) * 1e-3))
+
+        else:
+            data[column] = rng.randn(num_rows)
+
+    return pd.DataFrame(data, columns=columns)
+
+
+class SoakTest(object):
+    """
+    Runs environment for many steps, resets and rebuilds on synthetic (or any given) data
+    and tracks throughput and memory per window of steps.
+
+    Test fails if throughput of the last windows drops below that of the first ones
+    by more than `throughput_tolerance` fraction, or if memory grows by more than `memory_tolerance` MB.
+    Memory is summed over driver process and every process hosting remote kernels,
+    when environments carry resource monitor (see EnvironmentConstructor `monitor_config`).
+    """
+    def __init__(
+            self,
+            env_constructor,
+            env_config,
+            num_steps=1000000,
+            rebuild_every=100,
+            window=10000,
+            warmup_windows=2,
+            compare_windows=5,
+            throughput_tolerance=0.2,
+            memory_tolerance=50.0,
+            output_path=None,
+            seed=None,
+            verbose=False,
+    ):
+        """
+
+        Args:
+            env_constructor:        callable returning environment instance given env_config
+            env_config:             env hyperparameters dict
+            num_steps:              total number of environment steps to make
+            rebuild_every:          number of episodes to run before environment is rebuilt, None - never rebuild
+            window:                 number of steps per measurement window
+            warmup_windows:         number of first windows excluded from baseline
+            compare_windows:        number of windows baseline and final values are taken median over
+            throughput_tolerance:   allowed relative throughput drop
+            memory_tolerance:       allowed memory growth, MB
+            output_path:            json-lines file to stream per-window measurements to; None - do not save
+            seed:                   random seed of actions sampled from environment action space
+            verbose:                if True, prints every window measurements
+        """
+        self.env_constructor = env_constructor
+        self.env_config = env_config
+        self.num_steps = num_steps
+        self.rebuild_every = rebuild_every
+        self.window = window
+        self.warmup_windows = warmup_windows
+        self.compare_windows = compare_windows
+        self.throughput_tolerance = throughput_tolerance
+        self.memory_tolerance = memory_tolerance
+        self.output_path = output_path
+        self.rng = np.random.RandomState(seed)
+        self.verbose = verbose
+
+        self.windows = []
+
+    @staticmethod
+    def get_memory(env):
+        """
+        Returns RSS in bytes summed over current process and all processes hosting env kernels.
+        """
+        pids = {os.getpid()}
+        if getattr(env, 'monitor', None) is not None:
+            pids.update(
+                usage['pid'] for name, usage in env.monitor.sample().items() if name != 'object_store'
+            )
+
+        rss = 0
+        for pid in pids:
+            try:
+                rss += psutil.Process(pid).memory_info().rss
+
+            except psutil.Error:
+                # Remote processes could reside on other machines:
+                pass
+
+        return rss
+
+    def run(self):
+        """
+        Runs soak test.
+
+        Returns:
+            dictionary of test summary, `passed` entry holds the verdict
+        """
+        output = None if self.output_path is None else open(self.output_path, 'a')
+        steps = episodes = resets = rebuilds = 0
+        env = None
+        window_start = time.time()
+        try:
+            while steps < self.num_steps:
+                if env is None or (self.rebuild_every is not None and episodes % self.rebuild_every == 0):
+                    if env is not None:
+                        env.close()
+
+                    env = None
+                    env = self.env_constructor(self.env_config)
+                    # Random actions of any action space type, reproducible given `seed`:
+                    env.action_space.seed(int(self.rng.randint(2 ** 31)))
+                    rebuilds += 1
+
+                env.reset()
+                resets += 1
+                done = False
+                while not done and steps < self.num_steps:
+                    _, _, done, _ = env.step(env.action_space.sample())
+                    # Multi-agent environments report done flag per agent:
+                    if isinstance(done, list):
+                        done = all(done)
+
+                    steps += 1
+
+                    if steps % self.window == 0:
+                        elapsed = time.time() - window_start
+                        measurement = dict(
+                            steps=steps,
+                            episodes=episodes,
+                            resets=resets,
+                            rebuilds=rebuilds,
+                            steps_per_second=self.window / elapsed,
+                            rss_mb=self.get_memory(env) / 2**20,
+                        )
+                        self.windows.append(measurement)
+                        if output is not None:
+                            output.write(json.dumps(measurement) + '\n')
+                            output.flush()
+
+                        if self.verbose:
+                            print(measurement)
+
+                        # Exclude measurement itself from next window:
+                        window_start = time.time()
+
+                episodes += 1
+
+        finally:
+            if output is not None:
+                output.close()
+
+            if env is not None:
+                env.close()
+
+        return self.summary()
+
+    def summary(self):
+        windows = self.windows[self.warmup_windows:]
+        try:
+            assert len(windows) >= 2 * self.compare_windows
+
+        except AssertionError:
+            raise ValueError(
+                'Expected at least {} measurement windows after warm-up, got: {}; decrease `window` or '
+                'increase `num_steps`'.format(2 * self.compare_windows, len(windows))
+            )
+
+        baseline = windows[:self.compare_windows]
+        final = windows[-self.compare_windows:]
+        baseline_throughput = np.median([w['steps_per_second'] for w in baseline])
+        final_throughput = np.median([w['steps_per_second'] for w in final])
+        baseline_memory = np.median([w['rss_mb'] for w in baseline])
+        final_memory = np.median([w['rss_mb'] for w in final])
+
+        throughput_drop = 1.0 - final_throughput / baseline_throughput
+        memory_growth = final_memory - baseline_memory
+
+        return dict(
+            steps=self.windows[-1]['steps'],
+            episodes=self.windows[-1]['episodes'],
+            rebuilds=self.windows[-1]['rebuilds'],
+            baseline_steps_per_second=float(baseline_throughput),
+            final_steps_per_second=float(final_throughput),
+            throughput_drop=float(throughput_drop),
+            baseline_rss_mb=float(baseline_memory),
+            final_rss_mb=float(final_memory),
+            memory_growth_mb=float(memory_growth),
+            passed=bool(throughput_drop <= self.throughput_tolerance and memory_growth <= self.memory_tolerance),
+        )
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Runs environment on synthetic data for many steps, fails on throughput or memory drift.'
+    )
+    parser.add_argument(
+        '--constructor', default='tradeflow.sample_config:env_constructor',
+        help='environment constructor as `module:attribute`'
+    )
+    parser.add_argument('--rows', type=int, default=10000, help='synthetic dataset rows')
+    parser.add_argument('--episode-duration', type=int, default=100)
+    parser.add_argument('--steps', type=int, default=1000000)
+    parser.add_argument('--rebuild-every', type=int, default=100, help='episodes per environment rebuild')
+    parser.add_argument('--window', type=int, default=10000, help='steps per measurement window')
+    parser.add_argument('--warmup-windows', type=int, default=2)
+    parser.add_argument('--compare-windows', type=int, default=5)
+    parser.add_argument('--throughput-tolerance', type=float, default=0.2, help='allowed relative throughput drop')
+    parser.add_argument('--memory-tolerance', type=float, default=50.0, help='allowed memory growth, MB')
+    parser.add_argument('--output', default=None, help='json-lines file for per-window measurements')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args(args)
+
+    env_constructor = load_object(args.constructor)
+    test = SoakTest(
+        env_constructor=env_constructor,
+        env_config=dict(
+            dataset=make_synthetic_dataset(env_constructor.nodes_config, args.rows, args.seed),
+            episode_duration=args.episode_duration,
+        ),
+        num_steps=args.steps,
+        rebuild_every=args.rebuild_every,
+        window=args.window,
+        warmup_windows=args.warmup_windows,
+        compare_windows=args.compare_windows,
+        throughput_tolerance=args.throughput_tolerance,
+        memory_tolerance=args.memory_tolerance,
+        output_path=args.output,
+        seed=args.seed,
+        verbose=args.verbose,
+    )
+    summary = test.run()
+    print(json.dumps(summary, indent=2))
+    return 0 if summary['passed'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())